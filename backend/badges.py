@@ -0,0 +1,173 @@
+"""
+Regras automáticas de badges e sequências (streaks) mensais.
+
+As sequências ficam no próprio documento de gamificação e avançam um mês por
+avaliação, sem reler o histórico: `streak_months` conta meses consecutivos com
+atingimento >= 100% e `low_churn_months` meses consecutivos com churn abaixo de
+LOW_CHURN_LIMITE. `streak_last_month` é o último mês avaliado e os campos
+`*_base` guardam o valor anterior a ele, para que reavaliar o mesmo mês (nova
+escrita de KPI) não conte duas vezes.
+"""
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateMany, UpdateOne
+
+try:
+    from .scoring import KPI_NAMES
+except ImportError:
+    from scoring import KPI_NAMES
+
+STREAK_BADGES = (("streak_3", 3), ("streak_6", 6))
+LOW_CHURN_LIMITE = 3.0
+LOW_CHURN_MESES = 3
+
+# Badges concedidas pelo motor de regras; top_tpv depende da equipe e fica com o fechamento
+AUTO_BADGES = ("first_sale", "goal_crusher", "perfect_month", "streak_3", "streak_6", "low_churn")
+
+STREAK_FIELDS = ("streak_months", "streak_base", "low_churn_months", "low_churn_base", "streak_last_month")
+
+RESULT_FIELDS = tuple(f"{name}_realizado" for name in KPI_NAMES)
+
+
+def has_results(kpi: Optional[Dict]) -> bool:
+    """KPI com algum resultado lançado; leituras criam documentos padrão todos zerados"""
+    return bool(kpi) and any((kpi.get(field) or 0) > 0 for field in RESULT_FIELDS)
+
+
+def previous_month(month: str) -> str:
+    year, mon = map(int, month.split("-"))
+    return f"{year - 1:04d}-12" if mon == 1 else f"{year:04d}-{mon - 1:02d}"
+
+
+def _advance(state: Dict, prefix: str, month: str, qualifies: bool) -> Tuple[int, int]:
+    """(base, novo valor) da sequência `prefix` ao avaliar `month`"""
+    last = state.get("streak_last_month")
+    if last == month:
+        base = state.get(f"{prefix}_base", 0)
+    elif last == previous_month(month):
+        base = state.get(f"{prefix}_months", 0)
+    else:
+        base = 0
+    return base, (base + 1 if qualifies else 0)
+
+
+def evaluate(
+    month: str,
+    kpi: Optional[Dict],
+    atingimento: float,
+    all_kpis_hit: bool,
+    state: Optional[Dict],
+) -> Tuple[Optional[Dict], List[str]]:
+    """Novos campos de sequência (None se o mês é anterior ao último avaliado) e badges ainda não obtidas"""
+    state = state or {}
+    owned = {b.get("badge_id") for b in state.get("badges", [])}
+    earned = []
+    # Documento padrão (mês apenas consultado) conta como mês sem KPI
+    if not has_results(kpi):
+        kpi = None
+
+    if kpi:
+        if kpi.get("novos_ativos_realizado", 0) > 0:
+            earned.append("first_sale")
+        if atingimento >= 100:
+            earned.append("goal_crusher")
+        if all_kpis_hit:
+            earned.append("perfect_month")
+
+    last = state.get("streak_last_month")
+    streaks = None
+    if not last or month >= last:
+        streak_base, streak = _advance(state, "streak", month, bool(kpi) and atingimento >= 100)
+        churn_ok = bool(kpi) and kpi.get("churn_realizado", 0) < LOW_CHURN_LIMITE
+        churn_base, low_churn = _advance(state, "low_churn", month, churn_ok)
+        streaks = {
+            "streak_months": streak,
+            "streak_base": streak_base,
+            "low_churn_months": low_churn,
+            "low_churn_base": churn_base,
+            "streak_last_month": month,
+        }
+        earned.extend(badge for badge, meses in STREAK_BADGES if streak >= meses)
+        if low_churn >= LOW_CHURN_MESES:
+            earned.append("low_churn")
+
+    return streaks, [b for b in earned if b not in owned]
+
+
+def badge_update(user_id: str, badge_id: str, points: int, month: str, awarded_by: str) -> Tuple[Dict, Dict]:
+    """(filtro, update) de um $push condicionado: a badge só entra se o usuário ainda não a tiver"""
+    award = {
+        "badge_id": badge_id,
+        "awarded_at": datetime.now(timezone.utc).isoformat(),
+        "awarded_by": awarded_by,
+        "month": month,
+    }
+    return (
+        {"user_id": user_id, "badges.badge_id": {"$ne": badge_id}},
+        {"$push": {"badges": award, "achievements": award}, "$inc": {"total_points": points}},
+    )
+
+
+def badge_operation(user_id: str, badge_id: str, points: int, month: str, awarded_by: str) -> UpdateOne:
+    return UpdateOne(*badge_update(user_id, badge_id, points, month, awarded_by))
+
+
+def gamification_defaults(user_id: str) -> Dict:
+    import uuid
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "total_points": 0,
+        "badges": [],
+        "weekly_ranking": 0,
+        "monthly_ranking": 0,
+        "streak_months": 0,
+        "streak_base": 0,
+        "low_churn_months": 0,
+        "low_churn_base": 0,
+        "streak_last_month": None,
+        "achievements": [],
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+async def apply_results(
+    db,
+    month: str,
+    results: Iterable[Dict],
+    badge_points: Dict[str, int],
+    awarded_by: str,
+    update_leaderboard: bool = True,
+) -> int:
+    """Grava sequências e badges de um lote: um bulk_write de estado e outro de badges"""
+    state_ops, badge_ops, leaderboard_ops = [], [], []
+    for r in results:
+        streaks = r.get("streaks")
+        if streaks is not None:
+            defaults = {k: v for k, v in gamification_defaults(r["user_id"]).items() if k not in streaks}
+            state_ops.append(UpdateOne(
+                {"user_id": r["user_id"]},
+                {"$set": streaks, "$setOnInsert": defaults},
+                upsert=True,
+            ))
+        points = 0
+        badges = [b for b in r["badges"] if b in badge_points]
+        for badge_id in badges:
+            badge_ops.append(badge_operation(r["user_id"], badge_id, badge_points[badge_id], month, awarded_by))
+            points += badge_points[badge_id]
+        if update_leaderboard and (badges or streaks is not None):
+            update = {"$set": {"streak_months": streaks["streak_months"]}} if streaks is not None else {}
+            if badges:
+                update["$inc"] = {"total_points": points, "badges_count": len(badges)}
+            leaderboard_ops.append(UpdateMany({"user_id": r["user_id"]}, update))
+
+    if state_ops:
+        await db.gamification.bulk_write(state_ops, ordered=False)
+    awarded = 0
+    if badge_ops:
+        # Sem upsert: o documento já existe (estado acima) e o filtro $ne descarta repetidas
+        awarded = (await db.gamification.bulk_write(badge_ops, ordered=False)).modified_count
+    if leaderboard_ops:
+        await db.leaderboard.bulk_write(leaderboard_ops, ordered=False)
+    return awarded
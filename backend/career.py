@@ -0,0 +1,43 @@
+"""
+Elegibilidade de promoção no plano de carreira.
+
+Os níveis são ordenados por `order` e os requisitos (tpv_min, time_min) viram
+máximos acumulados, de modo que cada nível exige também os requisitos dos
+anteriores. Com limites monotônicos, o nível elegível de um agente sai de duas
+buscas binárias (bisect) em vez de um laço por nível.
+"""
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Dict, Iterable, List, Optional
+
+
+class CareerLadder:
+    """Escada de carreira pronta para buscas de elegibilidade"""
+
+    def __init__(self, levels: Iterable[Dict], allowed_names: Optional[Iterable[str]] = None):
+        allowed = set(allowed_names) if allowed_names is not None else None
+        ladder = sorted(
+            (lvl for lvl in levels if allowed is None or lvl.get("level") in allowed),
+            key=lambda lvl: lvl.get("order", 0),
+        )
+        self.names: List[str] = [lvl["level"] for lvl in ladder]
+        self.tpv_min: List[float] = list(accumulate((float(lvl.get("tpv_min") or 0) for lvl in ladder), max))
+        self.time_min: List[float] = list(accumulate((float(lvl.get("time_min") or 0) for lvl in ladder), max))
+        self._rank = {name: i for i, name in enumerate(self.names)}
+
+    def rank(self, level: str) -> Optional[int]:
+        """Posição do nível na escada (None se não faz parte dela)"""
+        return self._rank.get(level)
+
+    def eligible(self, tpv: float, months: float) -> Optional[str]:
+        """Nível mais alto cujos requisitos acumulados são atendidos"""
+        index = min(bisect_right(self.tpv_min, tpv), bisect_right(self.time_min, months)) - 1
+        return self.names[index] if index >= 0 else None
+
+    def promotion(self, current: str, tpv: float, months: float) -> Optional[str]:
+        """Novo nível se o agente subir; nunca rebaixa"""
+        current_rank = self.rank(current)
+        target = self.eligible(tpv, months)
+        if current_rank is None or target is None:
+            return None
+        return target if self._rank[target] > current_rank else None
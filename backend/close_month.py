@@ -0,0 +1,261 @@
+"""
+Fechamento de mês para toda a equipe.
+
+Percorre os agentes ativos por cursor (em ordem de id), calcula bônus, extrato,
+sequências e badges (regras de badges.py) em lotes num pool de processos e
+grava os resultados com bulk_write. Um documento de checkpoint em `month_close_checkpoints`
+registra o último agente gravado, permitindo retomar uma execução interrompida.
+
+Uso:
+    python -m backend.close_month 2026-09 [--force] [--chunk-size 200] [--workers 4]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+try:
+    from . import badges, scoring
+except ImportError:
+    import badges
+    import scoring
+
+CHUNK_SIZE = 200
+CHECKPOINTS = "month_close_checkpoints"
+
+
+def compute_chunk(rows: List[Dict], month: str) -> List[Dict]:
+    """Executado no pool de processos: bônus, extrato, sequências e badges de um lote de agentes"""
+    kpis = [r["kpi"] for r in rows]
+    score = scoring.score_team(
+        kpis,
+        [r["bonus_total"] for r in rows],
+        [r["base_salary"] for r in rows],
+    )
+    meta, realizado, present = scoring.kpi_matrix(kpis)
+    por_kpi = scoring.atingimento_por_kpi(meta, realizado)
+
+    results = []
+    for i, row in enumerate(rows):
+        ating = float(score["atingimento"][i])
+        streaks, earned = badges.evaluate(
+            month, row["kpi"], ating, bool(present[i] and (por_kpi[i] >= 100).all()), row["gamification"]
+        )
+        results.append({
+            "user_id": row["user_id"],
+            "has_bonus": row["has_bonus"],
+            "atingimento": round(ating, 1),
+            "multiplicador": float(score["multiplicador"][i]),
+            "bonus_final": float(score["bonus_final"][i]),
+            "tpv": float(row["kpi"].get("tpv_m1_realizado", 0)) if present[i] else 0.0,
+            "streaks": streaks,
+            "badges": earned,
+        })
+    return results
+
+
+async def _load_chunk(db, month: str, agents: List[Dict]) -> List[Dict]:
+    ids = [a["id"] for a in agents]
+    query = {"user_id": {"$in": ids}, "month": month}
+    kpis, bonus, gamification = await asyncio.gather(
+        db.kpis.find(query, {"_id": 0}).to_list(None),
+        db.bonus.find(query, {"_id": 0, "user_id": 1, "bonus_total": 1}).to_list(None),
+        db.gamification.find(
+            {"user_id": {"$in": ids}},
+            {"_id": 0, "user_id": 1, "badges.badge_id": 1, **{f: 1 for f in badges.STREAK_FIELDS}},
+        ).to_list(None),
+    )
+    kpis_by_user = {k["user_id"]: k for k in kpis}
+    bonus_by_user = {b["user_id"]: b for b in bonus}
+    gamification_by_user = {g["user_id"]: g for g in gamification}
+    return [
+        {
+            "user_id": a["id"],
+            "base_salary": a.get("base_salary", scoring.BASE_SALARY_DEFAULT),
+            "kpi": kpis_by_user.get(a["id"]),
+            "has_bonus": a["id"] in bonus_by_user,
+            "bonus_total": bonus_by_user.get(a["id"], {}).get("bonus_total", 0.0),
+            "gamification": gamification_by_user.get(a["id"]),
+        }
+        for a in agents
+    ]
+
+
+async def _write_results(db, month: str, results: List[Dict], badge_points: Dict[str, int]) -> Dict:
+    now = datetime.now(timezone.utc).isoformat()
+    bonus_ops, extrato_ops = [], []
+    for r in results:
+        if r["has_bonus"]:
+            bonus_ops.append(UpdateOne(
+                {"user_id": r["user_id"], "month": month},
+                {"$set": {"multiplicador": r["multiplicador"], "bonus_final": r["bonus_final"], "updated_at": now}},
+            ))
+        extrato_ops.append(UpdateOne(
+            {"user_id": r["user_id"], "month": month},
+            {
+                "$set": {"bonus_time": r["bonus_final"], "atingimento": r["atingimento"], "closed_at": now},
+                "$setOnInsert": {
+                    "id": _new_id(),
+                    "bonus_rentabilizacao": 0.0,
+                    "historico_semestral": [],
+                    "created_at": now,
+                },
+            },
+            upsert=True,
+        ))
+
+    if bonus_ops:
+        await db.bonus.bulk_write(bonus_ops, ordered=False)
+    if extrato_ops:
+        await db.extrato.bulk_write(extrato_ops, ordered=False)
+    # Os leaderboards são reconstruídos ao fim do fechamento
+    awarded = await badges.apply_results(db, month, results, badge_points, "month_close", update_leaderboard=False)
+    return {"bonus_updated": len(bonus_ops), "extrato_written": len(extrato_ops), "badges_awarded": awarded}
+
+
+def _new_id() -> str:
+    return str(uuid.uuid4())
+
+
+async def run_month_close(
+    db,
+    month: str,
+    badge_definitions: Dict[str, Dict],
+    chunk_size: int = CHUNK_SIZE,
+    workers: Optional[int] = None,
+    force: bool = False,
+    logger=None,
+    on_written: Optional[Callable[[List[str]], None]] = None,
+) -> Dict:
+    """Fecha o mês para todos os agentes ativos, retomando do checkpoint se houver
+
+    `on_written` recebe os ids de cada lote gravado (a API invalida os ETags dos bônus).
+    """
+    checkpoint = await db[CHECKPOINTS].find_one({"_id": month})
+    if checkpoint and checkpoint.get("status") == "done" and not force:
+        return checkpoint
+    if not checkpoint or force:
+        checkpoint = {
+            "_id": month,
+            "status": "running",
+            "last_user_id": None,
+            "processed": 0,
+            "bonus_updated": 0,
+            "extrato_written": 0,
+            "badges_awarded": 0,
+            "top_tpv": None,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+        }
+        await db[CHECKPOINTS].replace_one({"_id": month}, checkpoint, upsert=True)
+    elif logger:
+        logger.info(f"Retomando fechamento de {month} após {checkpoint['processed']} agentes")
+
+    badge_points = {b: badge_definitions[b]["points"] for b in badges.AUTO_BADGES if b in badge_definitions}
+    workers = workers or os.cpu_count() or 1
+    inicio = time.perf_counter()
+
+    query = {"role": "agent", "archived": {"$ne": True}}
+    if checkpoint.get("last_user_id"):
+        query["id"] = {"$gt": checkpoint["last_user_id"]}
+    cursor = db.users.find(query, {"_id": 0, "id": 1, "base_salary": 1}).sort("id", 1)
+
+    loop = asyncio.get_running_loop()
+    # spawn: os filhos não herdam as conexões/threads do processo da API
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        wave: List[List[Dict]] = []
+        chunk: List[Dict] = []
+
+        async def flush_wave():
+            chunks = await asyncio.gather(*(_load_chunk(db, month, c) for c in wave))
+            computed = await asyncio.gather(*(loop.run_in_executor(pool, compute_chunk, rows, month) for rows in chunks))
+            results = [r for part in computed for r in part]
+            written = await _write_results(db, month, results, badge_points)
+            if on_written:
+                on_written([r["user_id"] for r in results])
+
+            top = checkpoint.get("top_tpv")
+            for r in results:
+                if r["tpv"] > 0 and (top is None or r["tpv"] > top["tpv"]):
+                    top = {"user_id": r["user_id"], "tpv": r["tpv"]}
+
+            checkpoint["last_user_id"] = wave[-1][-1]["id"]
+            checkpoint["processed"] += len(results)
+            for key, value in written.items():
+                checkpoint[key] += value
+            checkpoint["top_tpv"] = top
+            checkpoint["updated_at"] = datetime.now(timezone.utc).isoformat()
+            await db[CHECKPOINTS].replace_one({"_id": month}, checkpoint)
+            if logger:
+                logger.info(f"Fechamento {month}: {checkpoint['processed']} agentes processados")
+            wave.clear()
+
+        async for agent in cursor:
+            chunk.append(agent)
+            if len(chunk) == chunk_size:
+                wave.append(chunk)
+                chunk = []
+                if len(wave) == workers:
+                    await flush_wave()
+        if chunk:
+            wave.append(chunk)
+        if wave:
+            await flush_wave()
+
+    # Campeão TPV depende da equipe inteira: concedido após o último lote
+    top = checkpoint.get("top_tpv")
+    if top and "top_tpv" in badge_definitions:
+        operation = badges.badge_operation(
+            top["user_id"], "top_tpv", badge_definitions["top_tpv"]["points"], month, "month_close"
+        )
+        checkpoint["badges_awarded"] += (await db.gamification.bulk_write([operation])).modified_count
+
+    checkpoint["status"] = "done"
+    checkpoint["duration_seconds"] = round(time.perf_counter() - inicio, 2)
+    checkpoint["finished_at"] = datetime.now(timezone.utc).isoformat()
+    await db[CHECKPOINTS].replace_one({"_id": month}, checkpoint)
+    return checkpoint
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Fecha o mês para todos os agentes")
+    parser.add_argument("month", help="Mês no formato YYYY-MM")
+    parser.add_argument("--force", action="store_true", help="Refaz um mês já fechado")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    # O servidor é importado como módulo de topo (uvicorn server:app a partir de backend/)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import server
+
+    async def run():
+        server.connect_mongo()
+        summary = await run_month_close(
+            server.db,
+            args.month,
+            server.BADGE_DEFINITIONS,
+            chunk_size=args.chunk_size,
+            workers=args.workers,
+            force=args.force,
+            logger=server.logger,
+        )
+        # Pontos de badges mudaram: reconstrói os leaderboards atuais
+        for period in server.LEADERBOARD_PERIODS:
+            await server.reconstruir_leaderboard(period)
+        server.close_mongo()
+        return summary
+
+    summary = asyncio.run(run())
+    print({k: v for k, v in summary.items() if k != "_id"})
+
+
+if __name__ == "__main__":
+    main()
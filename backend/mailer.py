@@ -0,0 +1,131 @@
+"""
+Transporte de emails do outbox.
+
+Com SMTP_HOST configurado, cada lote é enviado por uma única conexão SMTP
+(smtplib, executado fora do event loop). Sem SMTP, as mensagens apenas vão para
+o log, como no ambiente de desenvolvimento.
+
+O corpo dos emails (que pode conter senha temporária) é gravado cifrado no
+outbox (Fernet) e removido assim que o email sai do outbox, enviado ou não.
+"""
+import base64
+import hashlib
+import logging
+import os
+import smtplib
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Dict, List, Optional, Tuple
+
+from cryptography.fernet import Fernet, InvalidToken
+
+logger = logging.getLogger(__name__)
+
+
+def settings_from_env() -> Optional[Dict]:
+    """Configuração SMTP a partir do ambiente (None se SMTP_HOST não estiver definido)"""
+    host = os.environ.get("SMTP_HOST")
+    if not host:
+        return None
+    return {
+        "host": host,
+        "port": int(os.environ.get("SMTP_PORT", "587")),
+        "user": os.environ.get("SMTP_USER"),
+        "password": os.environ.get("SMTP_PASSWORD"),
+        "sender": os.environ.get("SMTP_FROM", "MOT <no-reply@mot.com>"),
+        "starttls": os.environ.get("SMTP_STARTTLS", "true").lower() in ("1", "true"),
+        "timeout": float(os.environ.get("SMTP_TIMEOUT", "10")),
+    }
+
+
+def body_cipher(secret: str) -> Fernet:
+    """Cifra do corpo dos emails derivada de um segredo do servidor"""
+    return Fernet(base64.urlsafe_b64encode(hashlib.sha256(secret.encode("utf-8")).digest()))
+
+
+def seal_body(cipher: Fernet, body: str) -> str:
+    return cipher.encrypt(body.encode("utf-8")).decode("ascii")
+
+
+def open_body(cipher: Fernet, sealed: str) -> Optional[str]:
+    """Corpo em texto claro, ou None se não puder ser decifrado (segredo trocado)"""
+    try:
+        return cipher.decrypt(sealed.encode("ascii")).decode("utf-8")
+    except (InvalidToken, ValueError):
+        return None
+
+
+def delivery_update(
+    email: Dict,
+    error: Optional[str],
+    now: datetime,
+    max_attempts: int,
+    retry_base: float,
+    retention: timedelta,
+    final: bool = False,
+) -> Tuple[str, Dict]:
+    """(status, update) após uma tentativa: enviados e descartados perdem o corpo e expiram após `retention`"""
+    attempts = email["attempts"] + 1
+    if error is None:
+        return "sent", {
+            "$set": {"status": "sent", "attempts": attempts, "sent_at": now.isoformat(), "expire_at": now + retention},
+            "$unset": {"body": "", "locked_until": ""},
+        }
+    if final or attempts >= max_attempts:
+        return "failed", {
+            "$set": {"status": "failed", "attempts": attempts, "last_error": error, "expire_at": now + retention},
+            "$unset": {"body": "", "locked_until": ""},
+        }
+    return "pending", {
+        "$set": {
+            "status": "pending",
+            "attempts": attempts,
+            "last_error": error,
+            "next_attempt_at": now + timedelta(seconds=retry_base * 2 ** (attempts - 1)),
+        },
+        "$unset": {"locked_until": ""},
+    }
+
+
+def build_message(sender: str, to: str, subject: str, body: str) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = sender
+    message["To"] = to
+    message["Subject"] = subject
+    message.set_content(body)
+    return message
+
+
+def send_batch(settings: Optional[Dict], emails: List[Dict]) -> List[Optional[str]]:
+    """Envia um lote (bloqueante); devolve o erro de cada email ou None se enviado"""
+    if settings is None:
+        for email in emails:
+            logger.info(f"📧 Email para {email['to']}: {email['subject']}\n{email['body']}")
+        return [None] * len(emails)
+
+    try:
+        smtp = smtplib.SMTP(settings["host"], settings["port"], timeout=settings["timeout"])
+    except (OSError, smtplib.SMTPException) as e:
+        return [f"Conexão SMTP falhou: {e}"] * len(emails)
+
+    errors: List[Optional[str]] = []
+    with smtp:
+        try:
+            if settings["starttls"]:
+                smtp.starttls()
+            if settings["user"]:
+                smtp.login(settings["user"], settings["password"] or "")
+        except (OSError, smtplib.SMTPException) as e:
+            return [f"Sessão SMTP falhou: {e}"] * len(emails)
+
+        for email in emails:
+            try:
+                smtp.send_message(build_message(settings["sender"], email["to"], email["subject"], email["body"]))
+                errors.append(None)
+            except smtplib.SMTPServerDisconnected as e:
+                # Conexão perdida: o restante do lote volta para nova tentativa
+                errors.extend([f"SMTP desconectado: {e}"] * (len(emails) - len(errors)))
+                break
+            except (OSError, smtplib.SMTPException) as e:
+                errors.append(str(e))
+    return errors
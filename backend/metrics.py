@@ -0,0 +1,281 @@
+"""
+Instrumentação do MongoDB e das requisições HTTP.
+
+Listeners do PyMongo registrados no cliente Motor: `PoolStats` acompanha o pool
+de conexões (conexões em uso, fila de espera por conexão, falhas de checkout) e
+`CommandStats` mantém um histograma de latência por comando. Os eventos chegam
+nas threads do Motor, por isso os contadores são protegidos por lock.
+
+`RequestMetrics` agrega latência, tamanho da resposta e comandos Mongo por rota.
+A contagem de comandos usa um ContextVar: o Motor copia o contexto da
+requisição para a thread que executa a operação, então `CommandStats.started`
+encontra o contador da requisição que originou o comando. `render_prometheus`
+exporta tudo no formato texto do Prometheus.
+"""
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import monitoring
+
+# Limites superiores (ms) dos buckets de latência
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# Comandos Mongo por requisição: valores altos indicam N+1
+COMMAND_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+RESPONSE_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """Histograma de buckets fixos (não cumulativos internamente)"""
+
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS_MS):
+        self.buckets: Tuple[float, ...] = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """[(limite, contagem acumulada)], terminando em +Inf"""
+        total, out = 0, []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            out.append((bound, total))
+        return out
+
+    def snapshot(self) -> Dict:
+        return {
+            "count": self.count,
+            "sum_ms": round(self.sum, 3),
+            "avg_ms": round(self.sum / self.count, 3) if self.count else 0.0,
+            "buckets": {("+Inf" if b == float("inf") else str(b)): c for b, c in self.cumulative()},
+        }
+
+
+def _address(address) -> str:
+    return f"{address[0]}:{address[1]}" if isinstance(address, tuple) else str(address)
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Conexões abertas, em uso e aguardando por servidor"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools: Dict[str, Dict] = {}
+
+    def _pool(self, address) -> Dict:
+        key = _address(address)
+        if key not in self._pools:
+            self._pools[key] = {
+                "open": 0,
+                "checked_out": 0,
+                "wait_queue": 0,
+                "max_checked_out": 0,
+                "max_wait_queue": 0,
+                "checkouts": 0,
+                "checkout_failures": defaultdict(int),
+                "cleared": 0,
+            }
+        return self._pools[key]
+
+    def _change(self, address, **deltas):
+        with self._lock:
+            pool = self._pool(address)
+            for field, delta in deltas.items():
+                pool[field] += delta
+            pool["max_checked_out"] = max(pool["max_checked_out"], pool["checked_out"])
+            pool["max_wait_queue"] = max(pool["max_wait_queue"], pool["wait_queue"])
+
+    def pool_created(self, event):
+        with self._lock:
+            self._pool(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._change(event.address, cleared=1)
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._pools.pop(_address(event.address), None)
+
+    def connection_created(self, event):
+        self._change(event.address, open=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._change(event.address, open=-1)
+
+    def connection_check_out_started(self, event):
+        self._change(event.address, wait_queue=1)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["wait_queue"] -= 1
+            pool["checkout_failures"][event.reason] += 1
+
+    def connection_checked_out(self, event):
+        self._change(event.address, wait_queue=-1, checked_out=1, checkouts=1)
+
+    def connection_checked_in(self, event):
+        self._change(event.address, checked_out=-1)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                address: {**pool, "checkout_failures": dict(pool["checkout_failures"])}
+                for address, pool in self._pools.items()
+            }
+
+
+class CommandStats(monitoring.CommandListener):
+    """Histograma de latência e falhas por nome de comando"""
+
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS_MS):
+        self._lock = threading.Lock()
+        self._buckets = tuple(buckets)
+        self.latency: Dict[str, Histogram] = {}
+        self.failures: Dict[str, int] = defaultdict(int)
+
+    def _observe(self, event):
+        with self._lock:
+            if event.command_name not in self.latency:
+                self.latency[event.command_name] = Histogram(self._buckets)
+            self.latency[event.command_name].observe(event.duration_micros / 1000)
+
+    def started(self, event):
+        counter = current_request_commands.get()
+        if counter is not None:
+            counter.add()
+
+    def succeeded(self, event):
+        self._observe(event)
+
+    def failed(self, event):
+        self._observe(event)
+        with self._lock:
+            self.failures[event.command_name] += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                name: {**hist.snapshot(), "failures": self.failures.get(name, 0)}
+                for name, hist in sorted(self.latency.items())
+            }
+
+
+class CommandCounter:
+    """Comandos Mongo emitidos durante uma requisição"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.closed = False
+
+    def add(self):
+        with self._lock:
+            # Tarefas criadas na requisição herdam o contexto e podem sobreviver a ela
+            if not self.closed:
+                self.count += 1
+
+    def close(self) -> int:
+        with self._lock:
+            self.closed = True
+            return self.count
+
+
+current_request_commands: ContextVar[Optional[CommandCounter]] = ContextVar("current_request_commands", default=None)
+
+
+class RequestMetrics:
+    """Latência, tamanho de resposta e comandos Mongo por (método, rota); usado só no event loop"""
+
+    def __init__(self):
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.commands: Dict[Tuple[str, str], Histogram] = {}
+        self.size: Dict[Tuple[str, str], Histogram] = {}
+        self.requests: Dict[Tuple[str, str, int], int] = defaultdict(int)
+
+    def observe(self, method: str, route: str, status: int, duration_ms: float, commands: int, size: int):
+        key = (method, route)
+        if key not in self.latency:
+            self.latency[key] = Histogram(LATENCY_BUCKETS_MS)
+            self.commands[key] = Histogram(COMMAND_COUNT_BUCKETS)
+            self.size[key] = Histogram(RESPONSE_SIZE_BUCKETS)
+        self.latency[key].observe(duration_ms)
+        self.commands[key].observe(commands)
+        self.size[key].observe(size)
+        self.requests[(method, route, status)] += 1
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def _histogram(lines: List[str], name: str, help_text: str, series: Dict, label_names: Tuple[str, ...], scale: float = 1.0):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for key, hist in sorted(series.items()):
+        labels = _labels(**dict(zip(label_names, key)))
+        for bound, count in hist.cumulative():
+            le = _number(bound if bound == float("inf") else bound / scale)
+            lines.append(f'{name}_bucket{{{labels},le="{le}"}} {count}')
+        lines.append(f"{name}_sum{{{labels}}} {hist.sum / scale!r}")
+        lines.append(f"{name}_count{{{labels}}} {hist.count}")
+
+
+def _simple(lines: List[str], name: str, kind: str, help_text: str, samples: Iterable[Tuple[Dict, float]]):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    for labels, value in samples:
+        lines.append(f"{name}{{{_labels(**labels)}}} {_number(value)}")
+
+
+def render_prometheus(requests: RequestMetrics, commands: CommandStats, pool: PoolStats) -> str:
+    """Formato texto do Prometheus (0.0.4); latências convertidas para segundos"""
+    lines: List[str] = []
+    route = ("method", "route")
+    _simple(lines, "mot_http_requests_total", "counter", "Requisições HTTP por rota e status", (
+        ({"method": m, "route": r, "status": s}, n) for (m, r, s), n in sorted(requests.requests.items())
+    ))
+    _histogram(lines, "mot_http_request_duration_seconds", "Latência das requisições HTTP", requests.latency, route, scale=1000)
+    _histogram(lines, "mot_http_request_mongo_commands", "Comandos MongoDB emitidos por requisição", requests.commands, route)
+    _histogram(lines, "mot_http_response_size_bytes", "Tamanho do corpo da resposta", requests.size, route)
+
+    with commands._lock:
+        latency = {(name,): hist for name, hist in commands.latency.items()}
+        _histogram(lines, "mot_mongo_command_duration_seconds", "Latência dos comandos MongoDB", latency, ("command",), scale=1000)
+        _simple(lines, "mot_mongo_command_failures_total", "counter", "Comandos MongoDB com falha", (
+            ({"command": name}, n) for name, n in sorted(commands.failures.items())
+        ))
+
+    pools = pool.snapshot()
+    for field, help_text in (
+        ("open", "Conexões abertas no pool"),
+        ("checked_out", "Conexões em uso"),
+        ("wait_queue", "Operações aguardando uma conexão livre"),
+    ):
+        _simple(lines, f"mot_mongo_pool_{field}", "gauge", help_text, (
+            ({"address": address}, stats[field]) for address, stats in sorted(pools.items())
+        ))
+    return "\n".join(lines) + "\n"
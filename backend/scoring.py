@@ -0,0 +1,204 @@
+"""
+Cálculo de atingimento, multiplicador e bônus final para a equipe inteira.
+
+As funções operam sobre matrizes NumPy (uma linha por agente/mês, uma coluna
+por KPI), de modo que rankings, bônus e relatórios usam exatamente a mesma
+fórmula — a mesma exibida no dashboard (frontend/src/utils/helpers.js).
+"""
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+
+KPI_NAMES = ("novos_ativos", "churn", "tpv_m1", "ativos_m1", "migracao_hunter")
+
+KPI_WEIGHTS = {"novos_ativos": 0.3, "churn": 0.2, "tpv_m1": 0.2, "ativos_m1": 0.15, "migracao_hunter": 0.15}
+
+KPI_META_DEFAULTS = {"novos_ativos": 12, "churn": 5.0, "tpv_m1": 100000.0, "ativos_m1": 10, "migracao_hunter": 70.0}
+
+CHURN_CAP = 200.0
+MULTIPLICADOR_FAIXAS = ((100.0, 1.0), (80.0, 0.8))
+BONUS_CAP_SALARIOS = 2
+BASE_SALARY_DEFAULT = 1570.0
+
+_WEIGHTS = np.array([KPI_WEIGHTS[k] for k in KPI_NAMES])
+_CHURN = KPI_NAMES.index("churn")
+
+
+def kpi_matrix(kpis: Sequence[Optional[Dict]]):
+    """Converte documentos de KPI em matrizes (meta, realizado) e máscara de presença"""
+    docs = [kpi or {} for kpi in kpis]
+    n = len(docs)
+    # Uma passada por coluna com np.fromiter: evita atribuir célula a célula no array
+    meta = np.empty((n, len(KPI_NAMES)))
+    realizado = np.empty((n, len(KPI_NAMES)))
+    for j, name in enumerate(KPI_NAMES):
+        meta_key, realizado_key, default = f"{name}_meta", f"{name}_realizado", KPI_META_DEFAULTS[name]
+        meta[:, j] = np.fromiter((d.get(meta_key, default) for d in docs), dtype=float, count=n)
+        realizado[:, j] = np.fromiter((d.get(realizado_key, 0) for d in docs), dtype=float, count=n)
+    present = np.fromiter((bool(d) for d in docs), dtype=bool, count=n)
+    return meta, realizado, present
+
+
+def atingimento_por_kpi(meta: np.ndarray, realizado: np.ndarray) -> np.ndarray:
+    """Atingimento (%) de cada KPI; churn é inverso e limitado a CHURN_CAP"""
+    valid = meta > 0
+    safe_meta = np.where(valid, meta, 1.0)
+    pct = realizado / safe_meta * 100
+    churn = (meta[:, _CHURN] - realizado[:, _CHURN]) / safe_meta[:, _CHURN] * 100 + 100
+    pct[:, _CHURN] = np.clip(churn, 0, CHURN_CAP)
+    return np.where(valid, pct, 0.0)
+
+
+def atingimento(meta: np.ndarray, realizado: np.ndarray, present: Optional[np.ndarray] = None) -> np.ndarray:
+    """Atingimento geral ponderado (%) por linha; linhas sem KPI valem 0"""
+    total = atingimento_por_kpi(meta, realizado) @ _WEIGHTS
+    if present is not None:
+        total = np.where(present, total, 0.0)
+    return total
+
+
+def multiplicador(atingimento_pct: np.ndarray) -> np.ndarray:
+    """1.0 a partir de 100% de atingimento, 0.8 a partir de 80%, senão 0"""
+    result = np.zeros_like(atingimento_pct, dtype=float)
+    for limite, valor in reversed(MULTIPLICADOR_FAIXAS):
+        result = np.where(atingimento_pct >= limite, valor, result)
+    return result
+
+
+def bonus_final(bonus_total: np.ndarray, mult: np.ndarray, base_salary: np.ndarray) -> np.ndarray:
+    """Bônus após o multiplicador, limitado a BONUS_CAP_SALARIOS salários base"""
+    return np.minimum(bonus_total * mult, base_salary * BONUS_CAP_SALARIOS)
+
+
+def score_team(
+    kpis: Sequence[Optional[Dict]],
+    bonus_totals: Optional[Iterable[float]] = None,
+    base_salaries: Optional[Iterable[float]] = None,
+) -> Dict[str, np.ndarray]:
+    """Atingimento, multiplicador e (se houver bônus) bônus final de uma equipe"""
+    meta, realizado, present = kpi_matrix(kpis)
+    ating = atingimento(meta, realizado, present)
+    mult = multiplicador(ating)
+    result = {"atingimento": ating, "multiplicador": mult}
+    if bonus_totals is not None:
+        totals = np.fromiter(bonus_totals, dtype=float, count=len(kpis))
+        salaries = (
+            np.fromiter(base_salaries, dtype=float, count=len(kpis))
+            if base_salaries is not None
+            else np.full(len(kpis), BASE_SALARY_DEFAULT)
+        )
+        result["bonus_final"] = bonus_final(totals, mult, salaries)
+    return result
+
+
+def score_kpi(kpi: Optional[Dict]):
+    """(atingimento %, multiplicador) de um único documento de KPI"""
+    result = score_team([kpi])
+    return float(result["atingimento"][0]), float(result["multiplicador"][0])
+
+
+ROLLUP_PERCENTIS = (25, 50, 75, 90)
+# Limites das faixas de churn realizado (%): <2, 2-5, 5-10, >=10
+CHURN_FAIXAS = (2.0, 5.0, 10.0)
+
+
+def _resumo(values: np.ndarray) -> Dict[str, float]:
+    """Soma, média e percentis de uma coluna (zeros para grupo vazio)"""
+    if not len(values):
+        return {"sum": 0.0, "avg": 0.0, **{f"p{p}": 0.0 for p in ROLLUP_PERCENTIS}}
+    percentis = np.percentile(values, ROLLUP_PERCENTIS)
+    return {
+        "sum": round(float(values.sum()), 2),
+        "avg": round(float(values.mean()), 2),
+        **{f"p{p}": round(float(v), 2) for p, v in zip(ROLLUP_PERCENTIS, percentis)},
+    }
+
+
+def rollup(kpis: Sequence[Optional[Dict]]) -> Dict:
+    """Agregados de um grupo de agentes: atingimento, cada KPI, metas batidas e faixas de churn"""
+    meta, realizado, present = kpi_matrix(kpis)
+    por_kpi = atingimento_por_kpi(meta, realizado)
+    ating = atingimento(meta, realizado, present)
+
+    kpi_stats = {}
+    for j, name in enumerate(KPI_NAMES):
+        kpi_stats[name] = {
+            **_resumo(realizado[:, j]),
+            "at_target": int(((por_kpi[:, j] >= 100) & present).sum()),
+        }
+
+    faixas = np.bincount(np.digitize(realizado[present, _CHURN], CHURN_FAIXAS), minlength=len(CHURN_FAIXAS) + 1)
+    limites = ("0",) + tuple(f"{v:g}" for v in CHURN_FAIXAS)
+    churn_distribution = {
+        (f"{limites[i]}-{limites[i + 1]}" if i < len(CHURN_FAIXAS) else f">={limites[i]}"): int(n)
+        for i, n in enumerate(faixas)
+    }
+
+    return {
+        "agents": len(kpis),
+        "with_kpis": int(present.sum()),
+        "atingimento": _resumo(ating),
+        "at_target": int((ating >= 100).sum()),
+        "below_80": int((ating < 80).sum()),
+        "kpis": kpi_stats,
+        "churn_distribution": churn_distribution,
+    }
+
+
+def atingimento_mongo_expr(kpi_path: str = "$kpi") -> Dict:
+    """Mesma fórmula de atingimento como expressão de agregação do MongoDB"""
+    def campo(nome, default):
+        return {"$ifNull": [f"{kpi_path}.{nome}", default]}
+
+    parcelas = []
+    for name in KPI_NAMES:
+        meta = campo(f"{name}_meta", KPI_META_DEFAULTS[name])
+        realizado = campo(f"{name}_realizado", 0)
+        if name == "churn":
+            valor = {"$min": [{"$max": [0, {"$add": [
+                {"$multiply": [{"$divide": [{"$subtract": [meta, realizado]}, meta]}, 100]}, 100
+            ]}]}, CHURN_CAP]}
+        else:
+            valor = {"$multiply": [{"$divide": [realizado, meta]}, 100]}
+        parcelas.append({"$cond": [{"$gt": [meta, 0]}, {"$multiply": [valor, KPI_WEIGHTS[name]]}, 0]})
+
+    return {"$cond": [{"$ifNull": [kpi_path, False]}, {"$add": parcelas}, 0]}
+
+
+def _benchmark(agents: int = 10_000, months: int = 12, repeat: int = 5):
+    """Vazão de ponta a ponta (documentos → bônus final) para agents × months linhas"""
+    import time
+
+    rows = agents * months
+    rng = np.random.default_rng(42)
+    meta = np.tile([KPI_META_DEFAULTS[k] for k in KPI_NAMES], (rows, 1)).astype(float)
+    realizado = meta * rng.uniform(0, 1.5, size=meta.shape)
+    # Mesmo formato que os chamadores recebem do Mongo: uma lista de dicts
+    docs = [
+        {**{f"{k}_meta": m for k, m in zip(KPI_NAMES, meta_row)},
+         **{f"{k}_realizado": r for k, r in zip(KPI_NAMES, realizado_row)}}
+        for meta_row, realizado_row in zip(meta.tolist(), realizado.tolist())
+    ]
+    bonus_totals = rng.uniform(0, 5000, size=rows)
+    salaries = np.full(rows, BASE_SALARY_DEFAULT)
+
+    conversao = calculo = total = float("inf")
+    for _ in range(repeat):
+        inicio = time.perf_counter()
+        m, r, present = kpi_matrix(docs)
+        meio = time.perf_counter()
+        ating = atingimento(m, r, present)
+        bonus_final(bonus_totals, multiplicador(ating), salaries)
+        fim = time.perf_counter()
+        conversao = min(conversao, meio - inicio)
+        calculo = min(calculo, fim - meio)
+        total = min(total, fim - inicio)
+
+    print(f"{agents} agentes × {months} meses = {rows} linhas")
+    print(f"conversão dos documentos: {conversao * 1000:.1f} ms")
+    print(f"cálculo vetorizado: {calculo * 1000:.1f} ms")
+    print(f"ponta a ponta (melhor de {repeat}): {total * 1000:.1f} ms ({rows / total / 1e6:.2f} M linhas/s)")
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -1,32 +1,115 @@
-from fastapi import FastAPI, APIRouter, Depends, HTTPException, status
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import OperationFailure, BulkWriteError, DuplicateKeyError, WaitQueueTimeoutError
 import os
+import time
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional, Dict
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, ValidationError
+from typing import List, Optional, Dict, Any
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import base64
+import hashlib
+import re
+import csv
+import io
+import json
+import zlib
 from datetime import datetime, timezone, timedelta
+from urllib.parse import parse_qsl, urlencode
 import bcrypt
 import jwt
 from enum import Enum
 
+import badges
+import mailer
+import metrics
+import scoring
+from career import CareerLadder
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
 
-app = FastAPI()
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '5000'))
+# Ex.: "zstd,snappy,zlib" (zstd e snappy exigem os pacotes zstandard / python-snappy)
+MONGO_COMPRESSORS = [c.strip() for c in os.environ.get('MONGO_COMPRESSORS', '').split(',') if c.strip()]
+
+# Listeners do PyMongo: pool de conexões e latência por comando (/api/internal/db-stats)
+pool_stats = metrics.PoolStats()
+command_stats = metrics.CommandStats()
+request_metrics = metrics.RequestMetrics()
+
+# Criados por connect_mongo() no lifespan da aplicação (ou por scripts como close_month.py)
+client: Optional[AsyncIOMotorClient] = None
+db = None
+
+def connect_mongo():
+    """Cria o cliente compartilhado com o pool configurado; idempotente"""
+    global client, db
+    if client is None:
+        options = {
+            "maxPoolSize": MONGO_MAX_POOL_SIZE,
+            "minPoolSize": MONGO_MIN_POOL_SIZE,
+            "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            "event_listeners": [pool_stats, command_stats],
+        }
+        if MONGO_COMPRESSORS:
+            options["compressors"] = MONGO_COMPRESSORS
+        client = AsyncIOMotorClient(mongo_url, **options)
+        db = client[os.environ['DB_NAME']]
+    return db
+
+def close_mongo():
+    global client, db
+    if client is not None:
+        client.close()
+        client, db = None, None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Cliente Mongo, índices, caches e workers acompanham o ciclo de vida da aplicação"""
+    connect_mongo()
+    try:
+        await startup()
+        yield
+    finally:
+        await shutdown()
+        close_mongo()
+
+app = FastAPI(lifespan=lifespan)
 api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
 
 JWT_SECRET = os.environ.get('JWT_SECRET', 'mot-secret-key-2025')
 JWT_ALGORITHM = "HS256"
 
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+AUTH_CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', '1024'))
+AUTH_CACHE_TTL = float(os.environ.get('AUTH_CACHE_TTL', '60'))
+
+ETAG_REGISTRY_SIZE = int(os.environ.get('ETAG_REGISTRY_SIZE', '10000'))
+ETAG_REGISTRY_TTL = float(os.environ.get('ETAG_REGISTRY_TTL', '10'))
+
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+PASSWORD_WORKERS = int(os.environ.get('PASSWORD_WORKERS', str(min(4, os.cpu_count() or 1))))
+PASSWORD_QUEUE_LIMIT = int(os.environ.get('PASSWORD_QUEUE_LIMIT', '32'))
+BULK_PASSWORD_WORKERS = int(os.environ.get('BULK_PASSWORD_WORKERS', str(max(1, PASSWORD_WORKERS // 2))))
+
+MONTH_PATTERN = r"^\d{4}-\d{2}$"
+
 class UserRole(str, Enum):
     ADMIN = "admin"
     AGENT = "agent"
@@ -66,6 +149,10 @@ class UserCreate(BaseModel):
     send_welcome_email: bool = False
     generate_temp_password: bool = False
 
+class UserBulkRow(UserCreate):
+    # Opcional quando generate_temp_password=true
+    password: Optional[str] = None
+
 class UserUpdate(BaseModel):
     name: Optional[str] = None
     email: Optional[EmailStr] = None
@@ -113,6 +200,10 @@ class KPIUpdate(BaseModel):
     ativos_m1_realizado: Optional[int] = None
     migracao_hunter_realizado: Optional[float] = None
 
+class KPIBulkRow(KPIUpdate):
+    user_id: str
+    month: str = Field(pattern=MONTH_PATTERN)
+
 class BonusFaixa(BaseModel):
     faixa: str
     tpv_min: float
@@ -204,11 +295,48 @@ class CompetenciaUpdate(BaseModel):
     criatividade: Optional[int] = None
 
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
+def needs_rehash(hashed_password: str) -> bool:
+    """Hash gerado com custo diferente do BCRYPT_ROUNDS atual ($2b$<custo>$...)"""
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+# bcrypt libera o GIL: um pool de threads dedicado executa os hashes em paralelo
+# sem bloquear o event loop
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="bcrypt")
+_password_jobs = 0
+# Importações em lote usam um pool próprio e limitado: login e troca de senha não
+# esperam atrás de centenas de hashes, e os lotes são processados um de cada vez
+bulk_password_executor = ThreadPoolExecutor(max_workers=BULK_PASSWORD_WORKERS, thread_name_prefix="bcrypt-bulk")
+_bulk_password_lock = asyncio.Lock()
+
+async def _run_password_job(func, *args):
+    """Executa bcrypt no pool, rejeitando com 429 quando a fila está cheia"""
+    global _password_jobs
+    if _password_jobs >= PASSWORD_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=429,
+            detail="Servidor ocupado, tente novamente em instantes",
+            headers={"Retry-After": "1"}
+        )
+    _password_jobs += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(password_executor, func, *args)
+    finally:
+        _password_jobs -= 1
+
+async def hash_password_async(password: str) -> str:
+    return await _run_password_job(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
 def create_token(user_id: str, role: str) -> str:
     payload = {
         "user_id": user_id,
@@ -225,9 +353,8 @@ def generate_temporary_password(length: int = 12) -> str:
     alphabet = string.ascii_letters + string.digits + "!@#$%&"
     return ''.join(secrets.choice(alphabet) for _ in range(length))
 
-async def send_welcome_email(user_name: str, user_email: str, password: str, is_temp: bool = False):
-    """Mock de envio de email de boas-vindas"""
-    # Em produção, integrar com SendGrid/AWS SES/Resend
+def welcome_email(user_name: str, user_email: str, password: str, is_temp: bool = False) -> tuple:
+    """(assunto, corpo) do email de boas-vindas"""
     email_template = f"""
     🎉 Bem-vindo(a) ao MOT - Meta On Time!
     
@@ -252,25 +379,224 @@ async def send_welcome_email(user_name: str, user_email: str, password: str, is_
     Atenciosamente,
     Equipe MOT
     """
-    
-    # Log para desenvolvimento (em produção, enviar email real)
-    print(f"\n{'='*60}")
-    print(f"📧 EMAIL DE BOAS-VINDAS ENVIADO")
-    print(f"{'='*60}")
-    print(email_template)
-    print(f"{'='*60}\n")
-    
-    return {"status": "sent", "to": user_email, "template": email_template}
+    return "Bem-vindo(a) ao MOT - Meta On Time", email_template
+
+async def send_welcome_email(user_name: str, user_email: str, password: str, is_temp: bool = False):
+    """Coloca o email de boas-vindas no outbox; a entrega acontece em segundo plano"""
+    subject, body = welcome_email(user_name, user_email, password, is_temp)
+    email_id = (await enqueue_emails([{"to": user_email, "subject": subject, "body": body}]))[0]
+    return {"status": "queued", "to": user_email, "id": email_id}
+
+# ==================== OUTBOX DE EMAILS ====================
+
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', '20'))
+OUTBOX_CONCURRENCY = int(os.environ.get('OUTBOX_CONCURRENCY', '2'))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '6'))
+OUTBOX_RETRY_BASE = float(os.environ.get('OUTBOX_RETRY_BASE', '30'))
+OUTBOX_POLL = float(os.environ.get('OUTBOX_POLL', '5'))
+OUTBOX_LOCK_SECONDS = 300
+# Emails enviados ou descartados (sem o corpo) ficam disponíveis para consulta por 7 dias
+OUTBOX_RETENTION = timedelta(days=7)
+# O corpo pode conter a senha temporária: fica cifrado no Mongo enquanto aguarda envio
+outbox_cipher = mailer.body_cipher(os.environ.get('OUTBOX_SECRET', JWT_SECRET))
+
+async def enqueue_emails(emails: List[Dict]) -> List[str]:
+    """Grava emails ({to, subject, body}) no outbox com um insert_many e acorda o worker"""
+    import uuid
+    now = datetime.now(timezone.utc)
+    docs = [
+        {
+            "id": str(uuid.uuid4()),
+            "to": email["to"],
+            "subject": email["subject"],
+            "body": mailer.seal_body(outbox_cipher, email["body"]),
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now.isoformat(),
+        }
+        for email in emails
+    ]
+    if docs:
+        await db.outbox.insert_many(docs)
+        outbox_worker.wake()
+    return [d["id"] for d in docs]
+
+class OutboxWorker:
+    """Entrega os emails do outbox em lotes, com concorrência limitada e retentativa exponencial"""
+    
+    def __init__(self, batch_size: int, concurrency: int, max_attempts: int, retry_base: float, poll: float):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.poll = poll
+        self.smtp = mailer.settings_from_env()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+    
+    def wake(self):
+        self._wakeup.set()
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _claim(self) -> List[Dict]:
+        """Reserva até batch_size emails devidos (ou presos em 'sending' por um worker que caiu)"""
+        now = datetime.now(timezone.utc)
+        claimed = []
+        for _ in range(self.batch_size):
+            doc = await db.outbox.find_one_and_update(
+                {"$or": [
+                    {"status": "pending", "next_attempt_at": {"$lte": now}},
+                    {"status": "sending", "locked_until": {"$lte": now}},
+                ]},
+                {"$set": {"status": "sending", "locked_until": now + timedelta(seconds=OUTBOX_LOCK_SECONDS)}},
+                sort=[("next_attempt_at", 1)],
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER,
+            )
+            if doc is None:
+                break
+            claimed.append(doc)
+        return claimed
+    
+    async def _deliver(self, emails: List[Dict]):
+        bodies = [mailer.open_body(outbox_cipher, email.get("body", "")) for email in emails]
+        readable = [{**email, "body": body} for email, body in zip(emails, bodies) if body is not None]
+        sent_errors = iter(await asyncio.to_thread(mailer.send_batch, self.smtp, readable) if readable else [])
+        now = datetime.now(timezone.utc)
+        operations = []
+        for email, body in zip(emails, bodies):
+            # Corpo ilegível (OUTBOX_SECRET trocado): nenhuma retentativa resolveria
+            error = next(sent_errors) if body is not None else "Corpo do email não pôde ser decifrado"
+            status, update = mailer.delivery_update(
+                email, error, now, self.max_attempts, self.retry_base, OUTBOX_RETENTION, final=body is None
+            )
+            if status == "sent":
+                self.sent += 1
+            elif status == "failed":
+                self.failed += 1
+                logger.error(f"Email {email['id']} para {email['to']} descartado após {email['attempts'] + 1} tentativas: {error}")
+            else:
+                self.retried += 1
+            operations.append(UpdateOne({"id": email["id"]}, update))
+        if operations:
+            await db.outbox.bulk_write(operations, ordered=False)
+    
+    async def run_once(self) -> int:
+        emails = await self._claim()
+        if emails:
+            # Cada fatia usa uma conexão SMTP; no máximo `concurrency` conexões simultâneas
+            size = -(-len(emails) // self.concurrency)
+            await asyncio.gather(*(self._deliver(emails[i:i + size]) for i in range(0, len(emails), size)))
+        return len(emails)
+    
+    async def _run(self):
+        while True:
+            try:
+                if await self.run_once() == self.batch_size:
+                    continue
+            except Exception as e:
+                logger.error(f"Falha no envio do outbox: {e}")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll)
+            except asyncio.TimeoutError:
+                pass
+    
+    def stats(self) -> Dict:
+        return {
+            "transport": "smtp" if self.smtp else "log",
+            "batch_size": self.batch_size,
+            "concurrency": self.concurrency,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed
+        }
+
+outbox_worker = OutboxWorker(OUTBOX_BATCH_SIZE, OUTBOX_CONCURRENCY, OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_BASE, OUTBOX_POLL)
+
+
+class TTLCache:
+    """Cache LRU limitado com expiração por entrada"""
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def set(self, key: str, value: Any):
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+    
+    def invalidate(self, key: str):
+        self._data.pop(key, None)
+    
+    def clear(self):
+        self._data.clear()
+    
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
 
+# Usuários autenticados, por id; invalidado em toda escrita no documento do usuário
+user_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         token = credentials.credentials
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        cached = user_cache.get(payload["user_id"])
+        if cached is not None:
+            return cached
         user = await db.users.find_one({"id": payload["user_id"]}, {"_id": 0})
         if not user:
             raise HTTPException(status_code=401, detail="Usuário não encontrado")
-        return User(**user)
+        current_user = User(**user)
+        user_cache.set(current_user.id, current_user)
+        return current_user
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expirado")
     except Exception:
@@ -281,6 +607,196 @@ async def require_admin(current_user: User = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Acesso negado")
     return current_user
 
+# ==================== CACHE HTTP (ETag) ====================
+
+# Rotas GET com ETag e o Cache-Control de cada uma; badges só mudam com deploy
+CACHEABLE_ROUTES = [
+    (re.compile(r"^/api/gamification/badges$"), "public, max-age=86400, immutable"),
+    (re.compile(r"^/api/career-levels$"), "private, no-cache"),
+    (re.compile(r"^/api/(kpis|bonus|forecast)/[^/]+/\d{4}-\d{2}$"), "private, no-cache"),
+    (re.compile(r"^/api/kpis/[^/]+$"), "private, no-cache"),
+    (re.compile(r"^/api/competencias/[^/]+$"), "private, no-cache"),
+]
+
+# Último ETag servido por caminho, um por query string (?from=&to= mudam o corpo).
+# TTL curto: escritas feitas por outros workers (ou pelo CLI de fechamento de mês)
+# ficam visíveis em no máximo ETAG_REGISTRY_TTL segundos
+etag_registry = TTLCache(ETAG_REGISTRY_SIZE, ETAG_REGISTRY_TTL)
+
+def query_key(query_string: str) -> str:
+    """Query string canônica: a ordem dos parâmetros não cria variantes diferentes"""
+    return urlencode(sorted(parse_qsl(query_string, keep_blank_values=True)))
+
+def registered_etag(path: str, query: str) -> Optional[str]:
+    variants = etag_registry.get(path)
+    entry = variants.get(query) if variants else None
+    if entry is None or entry[1] < time.monotonic():
+        return None
+    return entry[0]
+
+def register_etag(path: str, query: str, etag: str):
+    """Guarda o ETag da variante; a entrada do caminho agrupa as variantes para a invalidação"""
+    now = time.monotonic()
+    variants = {q: e for q, e in (etag_registry.get(path) or {}).items() if e[1] >= now}
+    variants[query] = (etag, now + ETAG_REGISTRY_TTL)
+    etag_registry.set(path, variants)
+
+def cache_control_for(path: str) -> Optional[str]:
+    for pattern, cache_control in CACHEABLE_ROUTES:
+        if pattern.match(path):
+            return cache_control
+    return None
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+def invalidate_cached(path: str):
+    """Descarta os ETags do caminho e dos caminhos pai (ex.: /api/kpis/u/m invalida /api/kpis/u)"""
+    while path.startswith("/api/"):
+        etag_registry.invalidate(path)
+        path = path.rsplit("/", 1)[0]
+
+def invalidate_user_months(resource: str, user_ids: List[str], month: str):
+    """Invalida /api/{resource}/{user_id}/{month} após escritas feitas fora de uma requisição"""
+    for user_id in user_ids:
+        invalidate_cached(f"/api/{resource}/{user_id}/{month}")
+
+async def not_modified(request: Request, current_user: User = Depends(get_current_user)):
+    """Responde 304 antes de consultar o Mongo quando o ETag do cliente ainda é o atual"""
+    user_id = request.path_params.get("user_id")
+    if user_id and current_user.role != UserRole.ADMIN and current_user.id != user_id:
+        raise HTTPException(status_code=403, detail="Acesso negado")
+    etag = registered_etag(request.url.path, query_key(request.url.query))
+    if etag and etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(
+            status_code=304,
+            headers={"ETag": etag, "Cache-Control": cache_control_for(request.url.path) or "no-cache"}
+        )
+
+class ETagMiddleware:
+    """ETag forte (hash do corpo) nas rotas de CACHEABLE_ROUTES e 304 para If-None-Match"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        path = scope["path"]
+        method = scope["method"]
+        
+        if method not in ("GET", "HEAD"):
+            async def send_and_invalidate(message):
+                if message["type"] == "http.response.start" and message["status"] < 400:
+                    invalidate_cached(path)
+                await send(message)
+            return await self.app(scope, receive, send_and_invalidate)
+        
+        cache_control = cache_control_for(path)
+        if cache_control is None:
+            return await self.app(scope, receive, send)
+        
+        if_none_match = None
+        for name, value in scope["headers"]:
+            if name == b"if-none-match":
+                if_none_match = value.decode("latin-1")
+        
+        start: Dict = {}
+        body = []
+        
+        async def send_with_etag(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+                if message["status"] != 200:
+                    await send(message)
+                return
+            if start.get("status") != 200:
+                return await send(message)
+            body.append(message.get("body", b""))
+            if message.get("more_body"):
+                return
+            
+            content = b"".join(body)
+            etag = f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+            register_etag(path, query_key(scope.get("query_string", b"").decode("latin-1")), etag)
+            headers = [(k, v) for k, v in start["headers"] if k.lower() not in (b"etag", b"cache-control")]
+            headers += [(b"etag", etag.encode()), (b"cache-control", cache_control.encode())]
+            
+            if etag_matches(if_none_match, etag):
+                headers = [(k, v) for k, v in headers if k.lower() not in (b"content-length", b"content-type")]
+                await send({"type": "http.response.start", "status": 304, "headers": headers})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": content})
+        
+        await self.app(scope, receive, send_with_etag)
+
+# ==================== MÉTRICAS HTTP ====================
+
+class MetricsMiddleware:
+    """Latência, tamanho da resposta e comandos Mongo por rota (template, não o path real)"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        
+        counter = metrics.CommandCounter()
+        token = metrics.current_request_commands.set(counter)
+        inicio = time.perf_counter()
+        response = {"status": 500, "size": 0}
+        
+        async def send_and_measure(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["size"] += len(message.get("body", b""))
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_and_measure)
+        finally:
+            metrics.current_request_commands.reset(token)
+            # APIRoute.matches grava a rota no scope; rotas desconhecidas ficam agrupadas
+            route = scope.get("route")
+            request_metrics.observe(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                response["status"],
+                (time.perf_counter() - inicio) * 1000,
+                counter.close(),
+                response["size"],
+            )
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    """Métricas no formato texto do Prometheus (protegidas por METRICS_TOKEN, se definido)"""
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Token de métricas inválido")
+    return PlainTextResponse(
+        metrics.render_prometheus(request_metrics, command_stats, pool_stats),
+        media_type="text/plain; version=0.0.4",
+    )
+
+# Cópias minúsculas de nome e email: a busca por prefixo (?q=) usa índice sem $options "i"
+USER_SEARCH_FIELDS = ("name_lower", "email_lower")
+USER_PROJECTION = {"_id": 0, "password": 0, **{field: 0 for field in USER_SEARCH_FIELDS}}
+
+def user_search_keys(name: Optional[str] = None, email: Optional[str] = None) -> Dict[str, str]:
+    """Campos de busca a gravar junto com nome e/ou email"""
+    keys = {}
+    if name is not None:
+        keys["name_lower"] = name.lower()
+    if email is not None:
+        keys["email_lower"] = email.lower()
+    return keys
+
 @api_router.post("/auth/register")
 async def register(user_data: UserCreate):
     existing = await db.users.find_one({"email": user_data.email}, {"_id": 0})
@@ -289,7 +805,7 @@ async def register(user_data: UserCreate):
     
     import uuid
     user_id = str(uuid.uuid4())
-    hashed_pw = hash_password(user_data.password)
+    hashed_pw = await hash_password_async(user_data.password)
     
     user_doc = {
         "id": user_id,
@@ -303,27 +819,35 @@ async def register(user_data: UserCreate):
         "time_in_company": user_data.time_in_company,
         "archived": False,
         "created_at": datetime.now(timezone.utc).isoformat(),
-        "updated_at": None
+        "updated_at": None,
+        **user_search_keys(user_data.name, user_data.email)
     }
     
     result = await db.users.insert_one(user_doc)
     token = create_token(user_id, user_doc["role"])
     
-    user_response = {k: v for k, v in user_doc.items() if k != "password" and k != "_id"}
+    user_response = {k: v for k, v in user_doc.items() if k not in ("password", "_id", *USER_SEARCH_FIELDS)}
     
     return {"token": token, "user": user_response}
 
 @api_router.post("/auth/login")
 async def login(credentials: UserLogin):
     user = await db.users.find_one({"email": credentials.email}, {"_id": 0})
-    if not user or not verify_password(credentials.password, user["password"]):
+    if not user or not await verify_password_async(credentials.password, user["password"]):
         raise HTTPException(status_code=401, detail="Credenciais inválidas")
     
     if user.get("archived", False):
         raise HTTPException(status_code=403, detail="Usuário arquivado. Contate o administrador.")
     
+    # Atualiza o hash de forma transparente quando o custo configurado muda
+    if needs_rehash(user["password"]):
+        await db.users.update_one(
+            {"id": user["id"]},
+            {"$set": {"password": await hash_password_async(credentials.password)}}
+        )
+    
     token = create_token(user["id"], user["role"])
-    user_data = {k: v for k, v in user.items() if k != "password"}
+    user_data = {k: v for k, v in user.items() if k not in ("password", *USER_SEARCH_FIELDS)}
     
     return {
         "token": token,
@@ -336,13 +860,88 @@ async def login(credentials: UserLogin):
 async def get_me(current_user: User = Depends(get_current_user)):
     return current_user
 
+USERS_PAGE_SIZE = 100
+USERS_MAX_PAGE_SIZE = 500
+
+def encode_cursor(user: Dict) -> str:
+    raw = json.dumps([user.get("created_at"), user["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        created_at, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return created_at, user_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+async def list_users_page(
+    query: Dict,
+    response: Response,
+    cursor: Optional[str],
+    limit: int,
+    fields: Optional[str],
+    role: Optional[UserRole],
+    career_level: Optional[CareerLevel],
+    q: Optional[str],
+    include_total: bool
+) -> List[Dict]:
+    """Página de usuários ordenada por (created_at, id), com filtros e projeção"""
+    query = dict(query)
+    if role is not None:
+        query["role"] = role.value
+    if career_level is not None:
+        query["career_level"] = career_level.value
+    if q:
+        # Prefixo ancorado nos campos minúsculos: cada ramo do $or vira um IXSCAN limitado
+        pattern = {"$regex": "^" + re.escape(q.strip().lower())}
+        query["$or"] = [{"name_lower": pattern}, {"email_lower": pattern}]
+    
+    total = await db.users.count_documents(query) if include_total else None
+    
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        if created_at is None:
+            # Usuários sem created_at vêm primeiro na ordenação
+            after = [{"created_at": {"$type": "string"}}, {"created_at": None, "id": {"$gt": last_id}}]
+        else:
+            after = [{"created_at": {"$gt": created_at}}, {"created_at": created_at, "id": {"$gt": last_id}}]
+        query = {"$and": [query, {"$or": after}]}
+    
+    if fields:
+        projection = {
+            f.strip(): 1 for f in fields.split(",")
+            if f.strip() and f.strip() not in ("password", *USER_SEARCH_FIELDS)
+        }
+        projection.update({"_id": 0, "id": 1, "created_at": 1})
+    else:
+        projection = USER_PROJECTION
+    
+    limit = max(1, min(limit, USERS_MAX_PAGE_SIZE))
+    users = await db.users.find(query, projection).sort([("created_at", 1), ("id", 1)]).limit(limit + 1).to_list(None)
+    
+    if len(users) > limit:
+        users = users[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(users[-1])
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
+    return users
+
 @api_router.get("/users")
-async def get_users(include_archived: bool = False, current_user: User = Depends(require_admin)):
-    """Admin lista usuários ativos (ou todos se include_archived=true)"""
+async def get_users(
+    response: Response,
+    include_archived: bool = False,
+    cursor: Optional[str] = None,
+    limit: int = USERS_PAGE_SIZE,
+    fields: Optional[str] = None,
+    role: Optional[UserRole] = None,
+    career_level: Optional[CareerLevel] = None,
+    q: Optional[str] = None,
+    include_total: bool = False,
+    current_user: User = Depends(require_admin)
+):
+    """Admin lista usuários ativos (ou todos se include_archived=true), paginados por cursor"""
     query = {} if include_archived else {"archived": {"$ne": True}}
-    cursor = db.users.find(query, {"_id": 0, "password": 0})
-    users = await cursor.to_list(length=1000)
-    return users if users else []
+    return await list_users_page(query, response, cursor, limit, fields, role, career_level, q, include_total)
 
 
 @api_router.post("/auth/first-login-password-change")
@@ -359,7 +958,7 @@ async def first_login_password_change(
         raise HTTPException(status_code=400, detail="Senha deve ter no mínimo 6 caracteres")
     
     # Atualizar senha e marcar first_login como False
-    new_hashed_pw = hash_password(password_data.new_password)
+    new_hashed_pw = await hash_password_async(password_data.new_password)
     await db.users.update_one(
         {"id": current_user.id},
         {
@@ -371,6 +970,7 @@ async def first_login_password_change(
             }
         }
     )
+    user_cache.invalidate(current_user.id)
     
     return {"message": "Senha alterada com sucesso. Você pode continuar usando o sistema."}
 
@@ -385,7 +985,7 @@ async def change_password(
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     
     # Verificar senha antiga
-    if not verify_password(password_data.old_password, user["password"]):
+    if not await verify_password_async(password_data.old_password, user["password"]):
         raise HTTPException(status_code=401, detail="Senha antiga incorreta")
     
     # Validar nova senha
@@ -393,7 +993,7 @@ async def change_password(
         raise HTTPException(status_code=400, detail="Senha deve ter no mínimo 6 caracteres")
     
     # Atualizar senha
-    new_hashed_pw = hash_password(password_data.new_password)
+    new_hashed_pw = await hash_password_async(password_data.new_password)
     await db.users.update_one(
         {"id": current_user.id},
         {
@@ -403,11 +1003,12 @@ async def change_password(
             }
         }
     )
+    user_cache.invalidate(current_user.id)
     
     return {"message": "Senha alterada com sucesso"}
 
     query = {} if include_archived else {"archived": {"$ne": True}}
-    users = await db.users.find(query, {"_id": 0, "password": 0}).to_list(1000)
+    users = await db.users.find(query, USER_PROJECTION).to_list(1000)
     return users
 
 @api_router.get("/users/{user_id}")
@@ -415,7 +1016,7 @@ async def get_user(user_id: str, current_user: User = Depends(get_current_user))
     if current_user.role != UserRole.ADMIN and current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Acesso negado")
     
-    user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
+    user = await db.users.find_one({"id": user_id}, USER_PROJECTION)
     if not user:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     return user
@@ -434,11 +1035,11 @@ async def create_user(user_data: UserCreate, current_user: User = Depends(requir
     # Determinar senha (temporária ou definida)
     if user_data.generate_temp_password:
         temp_password = generate_temporary_password()
-        hashed_pw = hash_password(temp_password)
+        hashed_pw = await hash_password_async(temp_password)
         is_temp = True
         password_to_send = temp_password
     else:
-        hashed_pw = hash_password(user_data.password)
+        hashed_pw = await hash_password_async(user_data.password)
         is_temp = False
         password_to_send = user_data.password
     
@@ -456,11 +1057,15 @@ async def create_user(user_data: UserCreate, current_user: User = Depends(requir
         "first_login": True,
         "temporary_password": is_temp,
         "created_at": datetime.now(timezone.utc).isoformat(),
-        "updated_at": None
+        "updated_at": None,
+        **user_search_keys(user_data.name, user_data.email)
     }
     
     await db.users.insert_one(user_doc)
-    created_user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
+    created_user = await db.users.find_one({"id": user_id}, USER_PROJECTION)
+    await atualizar_leaderboard_usuario(user_id)
+    if user_doc["role"] == UserRole.AGENT.value:
+        await enqueue_user_rollups(user_id, [user_doc["career_level"]])
     
     # Enviar email de boas-vindas se solicitado
     email_result = None
@@ -483,6 +1088,145 @@ async def create_user(user_data: UserCreate, current_user: User = Depends(requir
         }
     }
 
+USERS_BULK_MAX = 1000
+# Comparação de emails sem diferenciar maiúsculas/minúsculas
+EMAIL_COLLATION = {"locale": "en", "strength": 2}
+
+async def _read_bulk_users(request: Request, fmt: str) -> List[tuple]:
+    """(número da linha, dict) de um corpo CSV com cabeçalho ou de uma lista JSON"""
+    if fmt == "csv":
+        return [
+            (row_number, {k: v for k, v in raw.items() if v is not None})
+            async for row_number, raw in _iter_bulk_rows(request, "csv")
+        ]
+    try:
+        payload = json.loads(await request.body() or b"[]")
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"JSON inválido: {e}")
+    if isinstance(payload, dict):
+        payload = payload.get("users", [])
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=400, detail="Envie uma lista de usuários")
+    return list(enumerate(payload, start=1))
+
+@api_router.post("/users/bulk")
+async def bulk_create_users(request: Request, format: Optional[str] = None, current_user: User = Depends(require_admin)):
+    """Cria usuários em lote (CSV ou lista JSON) e devolve o resultado de cada linha"""
+    import uuid
+    content_type = request.headers.get("content-type", "")
+    fmt = format or ("csv" if "csv" in content_type else "json")
+    if fmt not in ("csv", "json"):
+        raise HTTPException(status_code=400, detail="Formato inválido (use csv ou json)")
+    
+    raw_rows = await _read_bulk_users(request, fmt)
+    if len(raw_rows) > USERS_BULK_MAX:
+        raise HTTPException(status_code=400, detail=f"Máximo de {USERS_BULK_MAX} usuários por requisição")
+    
+    results: Dict[int, Dict] = {}
+    valid: List[tuple] = []
+    seen_emails = set()
+    for row_number, raw in raw_rows:
+        try:
+            row = UserBulkRow(**raw)
+        except (ValidationError, TypeError) as e:
+            results[row_number] = {"row": row_number, "status": "error", "error": str(e)}
+            continue
+        email = row.email.lower()
+        if not row.password and not row.generate_temp_password:
+            results[row_number] = {"row": row_number, "email": row.email, "status": "error", "error": "Senha obrigatória"}
+        elif email in seen_emails:
+            results[row_number] = {"row": row_number, "email": row.email, "status": "error", "error": "Email repetido no lote"}
+        else:
+            seen_emails.add(email)
+            valid.append((row_number, row))
+    
+    # Uma única consulta para todos os emails do lote, sem diferenciar maiúsculas
+    # (índice email_ci com a mesma collation)
+    existing = set()
+    if valid:
+        stored = await db.users.distinct(
+            "email", {"email": {"$in": [row.email for _, row in valid]}}, collation=EMAIL_COLLATION
+        )
+        existing = {e.lower() for e in stored}
+    pending = []
+    for row_number, row in valid:
+        if row.email.lower() in existing:
+            results[row_number] = {"row": row_number, "email": row.email, "status": "error", "error": "Email já cadastrado"}
+        else:
+            pending.append((row_number, row, generate_temporary_password() if row.generate_temp_password else row.password))
+    
+    # bcrypt no pool dedicado aos lotes; o pool das requisições individuais fica livre
+    loop = asyncio.get_running_loop()
+    async with _bulk_password_lock:
+        hashes = await asyncio.gather(*(
+            loop.run_in_executor(bulk_password_executor, hash_password, password) for _, _, password in pending
+        ))
+    
+    now = datetime.now(timezone.utc).isoformat()
+    docs = []
+    for (row_number, row, _), hashed_pw in zip(pending, hashes):
+        docs.append({
+            "id": str(uuid.uuid4()),
+            "name": row.name,
+            "email": row.email,
+            "password": hashed_pw,
+            "role": row.role.value,
+            "career_level": row.career_level.value,
+            "base_salary": row.base_salary,
+            "active_base": row.active_base,
+            "time_in_company": row.time_in_company,
+            "archived": False,
+            "first_login": True,
+            "temporary_password": row.generate_temp_password,
+            "created_at": now,
+            "updated_at": None,
+            **user_search_keys(row.name, row.email)
+        })
+    
+    failed_indexes: Dict[int, str] = {}
+    if docs:
+        try:
+            await db.users.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            for err in e.details.get("writeErrors", []):
+                failed_indexes[err["index"]] = "Email já cadastrado" if err.get("code") == 11000 else err.get("errmsg", "Erro de escrita")
+    
+    created, emails = [], []
+    for index, ((row_number, row, password), doc) in enumerate(zip(pending, docs)):
+        if index in failed_indexes:
+            results[row_number] = {"row": row_number, "email": row.email, "status": "error", "error": failed_indexes[index]}
+            continue
+        created.append(doc)
+        results[row_number] = {
+            "row": row_number,
+            "email": row.email,
+            "status": "created",
+            "user_id": doc["id"],
+            "temporary_password": row.generate_temp_password,
+            "email_queued": row.send_welcome_email
+        }
+        if row.send_welcome_email:
+            subject, body = welcome_email(row.name, row.email, password, row.generate_temp_password)
+            emails.append({"to": row.email, "subject": subject, "body": body})
+    
+    # Um único insert no outbox; a entrega fica com o OutboxWorker
+    await enqueue_emails(emails)
+    
+    agents = [d for d in created if d["role"] == UserRole.AGENT.value]
+    if agents:
+        for period in LEADERBOARD_PERIODS:
+            await reconstruir_leaderboard(period)
+        current_month = datetime.now().strftime("%Y-%m")
+        for level in {d["career_level"] for d in agents}:
+            rollup_queue.enqueue(current_month, level)
+    
+    ordered_results = [results[n] for n in sorted(results)]
+    return {
+        "created": len(created),
+        "failed": len(ordered_results) - len(created),
+        "results": ordered_results
+    }
+
 @api_router.put("/users/{user_id}")
 async def update_user(user_id: str, update_data: UserUpdate, current_user: User = Depends(require_admin)):
     """Admin atualiza dados de usuário"""
@@ -501,7 +1245,7 @@ async def update_user(user_id: str, update_data: UserUpdate, current_user: User
             raise HTTPException(status_code=400, detail="Email já cadastrado por outro usuário")
         update_dict["email"] = update_data.email
     if update_data.password is not None:
-        update_dict["password"] = hash_password(update_data.password)
+        update_dict["password"] = await hash_password_async(update_data.password)
     if update_data.role is not None:
         update_dict["role"] = update_data.role.value if hasattr(update_data.role, 'value') else update_data.role
     if update_data.career_level is not None:
@@ -517,9 +1261,17 @@ async def update_user(user_id: str, update_data: UserUpdate, current_user: User
         raise HTTPException(status_code=400, detail="Nenhum dado para atualizar")
     
     update_dict["updated_at"] = datetime.now(timezone.utc).isoformat()
+    update_dict.update(user_search_keys(update_dict.get("name"), update_dict.get("email")))
     
     await db.users.update_one({"id": user_id}, {"$set": update_dict})
-    updated_user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
+    user_cache.invalidate(user_id)
+    updated_user = await db.users.find_one({"id": user_id}, USER_PROJECTION)
+    
+    if {"name", "role", "career_level"} & update_dict.keys():
+        await atualizar_leaderboard_usuario(user_id)
+    if {"role", "career_level"} & update_dict.keys():
+        # Sai do grupo antigo e entra no novo
+        await enqueue_user_rollups(user_id, list({user.get("career_level"), updated_user.get("career_level")} - {None}))
     
     return {"message": "Usuário atualizado com sucesso", "user": updated_user}
 
@@ -537,6 +1289,9 @@ async def archive_user(user_id: str, current_user: User = Depends(require_admin)
         {"id": user_id},
         {"$set": {"archived": True, "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
+    user_cache.invalidate(user_id)
+    await remover_usuario_leaderboard(user_id)
+    await enqueue_user_rollups(user_id, [user.get("career_level", CareerLevel.RECRUTA.value)])
     
     return {"message": "Usuário arquivado com sucesso", "user_id": user_id}
 
@@ -554,6 +1309,9 @@ async def unarchive_user(user_id: str, current_user: User = Depends(require_admi
         {"id": user_id},
         {"$set": {"archived": False, "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
+    user_cache.invalidate(user_id)
+    await atualizar_leaderboard_usuario(user_id)
+    await enqueue_user_rollups(user_id, [user.get("career_level", CareerLevel.RECRUTA.value)])
     
     return {"message": "Usuário desarquivado com sucesso", "user_id": user_id}
 
@@ -568,94 +1326,735 @@ async def delete_user(user_id: str, current_user: User = Depends(require_admin))
     if user_id == current_user.id:
         raise HTTPException(status_code=400, detail="Você não pode excluir sua própria conta")
     
-    # Excluir usuário e todos os dados relacionados
+    # Os rollups dos meses do agente são agendados antes de os KPIs sumirem
+    await enqueue_user_rollups(user_id, [user.get("career_level", CareerLevel.RECRUTA.value)])
+    
+    # Só o usuário sai no caminho da requisição; os dados relacionados são limpos em segundo plano
     await db.users.delete_one({"id": user_id})
-    await db.kpis.delete_many({"user_id": user_id})
-    await db.bonus.delete_many({"user_id": user_id})
-    await db.forecast.delete_many({"user_id": user_id})
-    await db.competencias.delete_many({"user_id": user_id})
-    await db.extrato.delete_many({"user_id": user_id})
-    await db.dre.delete_many({"user_id": user_id})
+    user_cache.invalidate(user_id)
+    user_cleanup_queue.enqueue(user_id)
     
     return {"message": "Usuário e todos os dados relacionados excluídos permanentemente", "user_id": user_id}
 
+@api_router.get("/internal/auth-cache")
+async def get_auth_cache_stats(current_user: User = Depends(require_admin)):
+    """Contadores do cache de usuários autenticados"""
+    return user_cache.stats()
+
+@api_router.get("/internal/bonus-queue")
+async def get_bonus_queue_stats(current_user: User = Depends(require_admin)):
+    """Estado da fila de recálculo de bônus"""
+    return bonus_queue.stats()
+
+@api_router.get("/internal/career-levels-cache")
+async def get_career_levels_cache_stats(current_user: User = Depends(require_admin)):
+    """Versão e recargas do cache do plano de carreira"""
+    return career_levels_cache.stats()
+
+@api_router.get("/internal/rollup-queue")
+async def get_rollup_queue_stats(current_user: User = Depends(require_admin)):
+    """Estado da fila de atualização dos rollups"""
+    return rollup_queue.stats()
+
 @api_router.get("/users/archived/list")
-async def get_archived_users(current_user: User = Depends(require_admin)):
-    """Admin lista usuários arquivados"""
-    users = await db.users.find({"archived": True}, {"_id": 0, "password": 0}).to_list(1000)
-    return users if users else []
+async def get_archived_users(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = USERS_PAGE_SIZE,
+    fields: Optional[str] = None,
+    role: Optional[UserRole] = None,
+    career_level: Optional[CareerLevel] = None,
+    q: Optional[str] = None,
+    include_total: bool = False,
+    current_user: User = Depends(require_admin)
+):
+    """Admin lista usuários arquivados, paginados por cursor"""
+    return await list_users_page({"archived": True}, response, cursor, limit, fields, role, career_level, q, include_total)
+
+
+
+async def get_or_create(collection, query: Dict, defaults: Dict) -> Dict:
+    """Leitura atômica em um round-trip: devolve o documento, criando-o com os padrões se não existir"""
+    on_insert = {k: v for k, v in defaults.items() if k not in query}
+    try:
+        return await collection.find_one_and_update(
+            query,
+            {"$setOnInsert": on_insert},
+            projection={"_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Upsert concorrente: o índice único garante que só um documento foi criado
+        return await collection.find_one(query, {"_id": 0})
 
+def default_kpi_doc(user_id: str, month: str) -> Dict:
+    import uuid
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "month": month,
+        "novos_ativos_meta": 12,
+        "novos_ativos_realizado": 0,
+        "churn_meta": 5.0,
+        "churn_realizado": 0.0,
+        "tpv_m1_meta": 100000.0,
+        "tpv_m1_realizado": 0.0,
+        "ativos_m1_meta": 10,
+        "ativos_m1_realizado": 0,
+        "migracao_hunter_meta": 70.0,
+        "migracao_hunter_realizado": 0.0,
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
 
+# Campos lançados pelo admin; um KPI com todos zerados é apenas o documento padrão
+KPI_RESULT_FIELDS = tuple(KPIUpdate.model_fields)
+
+HISTORICO_MESES = 6
+
+def shift_month(month: str, delta: int) -> str:
+    """Soma delta meses a um mês YYYY-MM"""
+    year, mon = map(int, month.split("-"))
+    index = year * 12 + mon - 1 + delta
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+def month_range(month_from: Optional[str], month_to: Optional[str]) -> Dict[str, Any]:
+    """Filtro {"month": {$gte, $lte}} com limites opcionais (vazio se nenhum)"""
+    bounds = {}
+    if month_from:
+        bounds["$gte"] = month_from
+    if month_to:
+        bounds["$lte"] = month_to
+    return {"month": bounds} if bounds else {}
+
+async def kpi_series(user_id: str, month_from: Optional[str], month_to: Optional[str]) -> List[Dict]:
+    """KPIs de um agente num intervalo de meses, em ordem, com o atingimento de cada mês"""
+    query: Dict[str, Any] = {"user_id": user_id, **month_range(month_from, month_to)}
+    kpis = await db.kpis.find(query, {"_id": 0}).sort("month", 1).to_list(None)
+    if kpis:
+        for kpi, ating in zip(kpis, scoring.score_team(kpis)["atingimento"]):
+            kpi["atingimento"] = round(float(ating), 1)
+    return kpis
+
+async def historico_semestral(user_id: str, month: str) -> List[Dict]:
+    """Atingimento e bônus final dos HISTORICO_MESES meses encerrados em `month`"""
+    month_from = shift_month(month, -(HISTORICO_MESES - 1))
+    kpis, bonus = await asyncio.gather(
+        kpi_series(user_id, month_from, month),
+        db.bonus.find(
+            {"user_id": user_id, "month": {"$gte": month_from, "$lte": month}},
+            {"_id": 0, "month": 1, "bonus_final": 1}
+        ).to_list(None),
+    )
+    bonus_by_month = {b["month"]: b.get("bonus_final", 0.0) for b in bonus}
+    return [
+        {"month": k["month"], "atingimento": k["atingimento"], "bonus": round(bonus_by_month.get(k["month"], 0.0), 2)}
+        for k in kpis
+    ]
 
-@api_router.get("/kpis/{user_id}/{month}")
+@api_router.get("/kpis/{user_id}", dependencies=[Depends(not_modified)])
+async def get_kpi_range(
+    user_id: str,
+    month_from: Optional[str] = Query(None, alias="from", pattern=MONTH_PATTERN),
+    month_to: Optional[str] = Query(None, alias="to", pattern=MONTH_PATTERN),
+    current_user: User = Depends(get_current_user)
+):
+    """Série de KPIs do agente entre from e to (inclusive) em uma única consulta"""
+    if current_user.role != UserRole.ADMIN and current_user.id != user_id:
+        raise HTTPException(status_code=403, detail="Acesso negado")
+    
+    return await kpi_series(user_id, month_from, month_to)
+
+@api_router.get("/kpis/{user_id}/{month}", dependencies=[Depends(not_modified)])
 async def get_kpi(user_id: str, month: str, current_user: User = Depends(get_current_user)):
     if current_user.role != UserRole.ADMIN and current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Acesso negado")
     
-    kpi = await db.kpis.find_one({"user_id": user_id, "month": month}, {"_id": 0})
-    if not kpi:
-        import uuid
-        kpi_doc = {
-            "id": str(uuid.uuid4()),
-            "user_id": user_id,
-            "month": month,
-            "novos_ativos_meta": 12,
-            "novos_ativos_realizado": 0,
-            "churn_meta": 5.0,
-            "churn_realizado": 0.0,
-            "tpv_m1_meta": 100000.0,
-            "tpv_m1_realizado": 0.0,
-            "ativos_m1_meta": 10,
-            "ativos_m1_realizado": 0,
-            "migracao_hunter_meta": 70.0,
-            "migracao_hunter_realizado": 0.0,
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }
-        await db.kpis.insert_one(kpi_doc)
-        kpi = await db.kpis.find_one({"user_id": user_id, "month": month}, {"_id": 0})
-    return kpi
+    return await get_or_create(db.kpis, {"user_id": user_id, "month": month}, default_kpi_doc(user_id, month))
 
 @api_router.put("/kpis/{user_id}/{month}")
 async def update_kpi(user_id: str, month: str, update: KPIUpdate, current_user: User = Depends(require_admin)):
-    kpi = await db.kpis.find_one({"user_id": user_id, "month": month}, {"_id": 0})
-    if not kpi:
-        raise HTTPException(status_code=404, detail="KPI não encontrado")
+    if not re.fullmatch(MONTH_PATTERN, month):
+        raise HTTPException(status_code=400, detail="Mês inválido (use YYYY-MM)")
+    if not await db.users.find_one({"id": user_id}, {"_id": 0, "id": 1}):
+        raise HTTPException(status_code=404, detail="Usuário não encontrado")
     
     update_data = {k: v for k, v in update.model_dump().items() if v is not None}
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
     
-    await db.kpis.update_one({"user_id": user_id, "month": month}, {"$set": update_data})
-    updated_kpi = await db.kpis.find_one({"user_id": user_id, "month": month}, {"_id": 0})
+    # Cria o KPI com os padrões se ainda não existir (a visão geral não grava mais placeholders)
+    defaults = {k: v for k, v in default_kpi_doc(user_id, month).items() if k not in update_data and k not in ("user_id", "month")}
+    try:
+        updated_kpi = await db.kpis.find_one_and_update(
+            {"user_id": user_id, "month": month},
+            {"$set": update_data, "$setOnInsert": defaults},
+            projection={"_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Upsert concorrente: o documento já existe, basta aplicar o $set
+        updated_kpi = await db.kpis.find_one_and_update(
+            {"user_id": user_id, "month": month},
+            {"$set": update_data},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+    
+    if month == datetime.now().strftime("%Y-%m"):
+        await atualizar_leaderboard_usuario(user_id)
+    bonus_queue.enqueue(user_id, month)
+    badge_queue.enqueue(user_id, month)
+    promotion_queue.enqueue(user_id)
+    await enqueue_rollups([(user_id, month)])
+    
     return updated_kpi
 
-@api_router.get("/bonus/{user_id}/{month}")
+# ==================== RECÁLCULO DE BÔNUS ====================
+
+BONUS_RECOMPUTE_DEBOUNCE = float(os.environ.get('BONUS_RECOMPUTE_DEBOUNCE', '2'))
+
+async def recompute_bonus(pairs: List[tuple], salaries: Optional[Dict[str, float]] = None) -> int:
+    """Recalcula multiplicador e bônus final dos bônus existentes para os pares (user_id, month)"""
+    if not pairs:
+        return 0
+    if salaries is None:
+        user_ids = list({uid for uid, _ in pairs})
+        users = await db.users.find({"id": {"$in": user_ids}}, {"_id": 0, "id": 1, "base_salary": 1}).to_list(None)
+        salaries = {u["id"]: u.get("base_salary", scoring.BASE_SALARY_DEFAULT) for u in users}
+    
+    by_month: Dict[str, List[str]] = {}
+    for user_id, month in pairs:
+        by_month.setdefault(month, []).append(user_id)
+    
+    bonus_ops, touched = [], []
+    for month, ids in by_month.items():
+        query = {"user_id": {"$in": ids}, "month": month}
+        kpis, bonus_docs = await asyncio.gather(
+            db.kpis.find(query, {"_id": 0}).to_list(None),
+            db.bonus.find(query, {"_id": 0, "user_id": 1, "bonus_total": 1}).to_list(None),
+        )
+        if not bonus_docs:
+            continue
+        kpis_by_user = {k["user_id"]: k for k in kpis}
+        score = scoring.score_team(
+            [kpis_by_user.get(b["user_id"]) for b in bonus_docs],
+            [b.get("bonus_total", 0.0) for b in bonus_docs],
+            [salaries.get(b["user_id"], scoring.BASE_SALARY_DEFAULT) for b in bonus_docs],
+        )
+        for bonus, mult, final in zip(bonus_docs, score["multiplicador"], score["bonus_final"]):
+            touched.append((bonus["user_id"], month))
+            bonus_ops.append(UpdateOne(
+                {"user_id": bonus["user_id"], "month": month},
+                {"$set": {
+                    "multiplicador": float(mult),
+                    "bonus_final": float(final),
+                    "updated_at": datetime.now(timezone.utc).isoformat()
+                }}
+            ))
+    
+    if bonus_ops:
+        await db.bonus.bulk_write(bonus_ops, ordered=False)
+        for user_id, month in touched:
+            invalidate_cached(f"/api/bonus/{user_id}/{month}")
+    return len(bonus_ops)
+
+class DebouncedQueue:
+    """Fila em processo que agrupa e adia (debounce) recálculos por chave, ex.: (usuário, mês)"""
+    
+    def __init__(self, debounce: float, handler, label: str):
+        self.debounce = debounce
+        self.handler = handler
+        self.label = label
+        self._pending: Dict[tuple, float] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.coalesced = 0
+        self.processed = 0
+        self.failures = 0
+    
+    def enqueue(self, *key):
+        if key in self._pending:
+            self.coalesced += 1
+        self.enqueued += 1
+        # Cada nova escrita adia o recálculo: rajadas viram um único recálculo
+        self._pending[key] = time.monotonic() + self.debounce
+        self._wakeup.set()
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Processa o que restou antes de encerrar
+        await self._process(list(self._pending))
+    
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            
+            now = time.monotonic()
+            due = [key for key, deadline in self._pending.items() if deadline <= now]
+            if not due:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), min(self._pending.values()) - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._process(due)
+    
+    async def _process(self, keys: List[tuple]):
+        for key in keys:
+            self._pending.pop(key, None)
+        if not keys:
+            return
+        try:
+            await self.handler(keys)
+            self.processed += len(keys)
+        except Exception as e:
+            self.failures += len(keys)
+            logger.error(f"Falha no {self.label} de {len(keys)} chave(s): {e}")
+    
+    def stats(self) -> Dict:
+        return {
+            "pending": len(self._pending),
+            "debounce_seconds": self.debounce,
+            "enqueued": self.enqueued,
+            "coalesced": self.coalesced,
+            "processed": self.processed,
+            "failures": self.failures
+        }
+
+bonus_queue = DebouncedQueue(BONUS_RECOMPUTE_DEBOUNCE, recompute_bonus, "recálculo de bônus")
+
+# ==================== ROLLUPS DA EQUIPE ====================
+
+ROLLUP_REFRESH_DEBOUNCE = float(os.environ.get('ROLLUP_REFRESH_DEBOUNCE', '5'))
+
+async def _rollup_group(month: str, career_level: str) -> UpdateOne:
+    agents = await db.users.find(
+        {"role": "agent", "archived": {"$ne": True}, "career_level": career_level},
+        {"_id": 0, "id": 1}
+    ).to_list(None)
+    ids = [a["id"] for a in agents]
+    kpis = await db.kpis.find({"month": month, "user_id": {"$in": ids}}, {"_id": 0}).to_list(None) if ids else []
+    kpis_by_user = {k["user_id"]: k for k in kpis}
+    doc = {
+        "month": month,
+        "career_level": career_level,
+        **scoring.rollup([kpis_by_user.get(uid) for uid in ids]),
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+    return UpdateOne({"month": month, "career_level": career_level}, {"$set": doc}, upsert=True)
+
+async def refresh_rollups(keys: List[tuple]) -> int:
+    """Recalcula apenas os grupos (month, career_level) afetados"""
+    keys = list(set(keys))
+    if not keys:
+        return 0
+    operations = await asyncio.gather(*(_rollup_group(month, level) for month, level in keys))
+    await db.rollups.bulk_write(list(operations), ordered=False)
+    return len(operations)
+
+rollup_queue = DebouncedQueue(ROLLUP_REFRESH_DEBOUNCE, refresh_rollups, "rollup")
+
+async def enqueue_rollups(pairs: List[tuple]):
+    """Agenda o rollup dos grupos dos pares (user_id, month) conforme o nível atual do agente"""
+    user_ids = list({uid for uid, _ in pairs})
+    users = await db.users.find({"id": {"$in": user_ids}}, {"_id": 0, "id": 1, "career_level": 1}).to_list(None)
+    levels = {u["id"]: u.get("career_level", CareerLevel.RECRUTA.value) for u in users}
+    for user_id, month in pairs:
+        if user_id in levels:
+            rollup_queue.enqueue(month, levels[user_id])
+
+async def enqueue_user_rollups(user_id: str, career_levels: List[str]):
+    """Agenda os meses do agente (e o atual) quando ele entra, sai ou muda de grupo"""
+    months = set(await db.kpis.distinct("month", {"user_id": user_id}))
+    months.add(datetime.now().strftime("%Y-%m"))
+    for month in months:
+        for level in career_levels:
+            rollup_queue.enqueue(month, level)
+
+def merge_rollups(groups: List[Dict]) -> Dict:
+    """Total da equipe a partir dos grupos; percentis não são combináveis e ficam de fora"""
+    agents = sum(g["agents"] for g in groups)
+    total = {
+        "agents": agents,
+        "with_kpis": sum(g["with_kpis"] for g in groups),
+        "at_target": sum(g["at_target"] for g in groups),
+        "below_80": sum(g["below_80"] for g in groups),
+        "atingimento": {},
+        "kpis": {},
+        "churn_distribution": {},
+    }
+    ating_sum = sum(g["atingimento"]["sum"] for g in groups)
+    total["atingimento"] = {"sum": round(ating_sum, 2), "avg": round(ating_sum / agents, 2) if agents else 0.0}
+    for name in scoring.KPI_NAMES:
+        kpi_sum = sum(g["kpis"][name]["sum"] for g in groups)
+        total["kpis"][name] = {
+            "sum": round(kpi_sum, 2),
+            "avg": round(kpi_sum / agents, 2) if agents else 0.0,
+            "at_target": sum(g["kpis"][name]["at_target"] for g in groups),
+        }
+    for g in groups:
+        for faixa, count in g["churn_distribution"].items():
+            total["churn_distribution"][faixa] = total["churn_distribution"].get(faixa, 0) + count
+    return total
+
+@api_router.get("/analytics/rollups")
+async def get_rollups(
+    month: Optional[str] = Query(None, pattern=MONTH_PATTERN),
+    career_level: Optional[CareerLevel] = None,
+    current_user: User = Depends(require_admin)
+):
+    """Agregados do mês por nível de carreira e o total da equipe"""
+    month = month or datetime.now().strftime("%Y-%m")
+    levels = [l.value for l in CareerLevel]
+    
+    groups = await db.rollups.find({"month": month}, {"_id": 0}).to_list(None)
+    missing = set(levels) - {g["career_level"] for g in groups}
+    if missing:
+        # Primeiro acesso ao mês: materializa os grupos que faltam
+        await refresh_rollups([(month, level) for level in missing])
+        groups = await db.rollups.find({"month": month}, {"_id": 0}).to_list(None)
+    
+    groups.sort(key=lambda g: levels.index(g["career_level"]) if g["career_level"] in levels else len(levels))
+    if career_level:
+        groups = [g for g in groups if g["career_level"] == career_level.value]
+    
+    return {"month": month, "groups": groups, "total": merge_rollups(groups)}
+
+# ==================== LIMPEZA DE USUÁRIOS EXCLUÍDOS ====================
+
+# Coleções com dados por user_id; a trilha de promoções é auditoria e é preservada
+USER_DATA_COLLECTIONS = ("kpis", "bonus", "forecast", "competencias", "extrato", "dre", "gamification")
+USER_CLEANUP_DEBOUNCE = float(os.environ.get('USER_CLEANUP_DEBOUNCE', '1'))
+ORPHAN_SWEEP_INTERVAL = float(os.environ.get('ORPHAN_SWEEP_INTERVAL', '3600'))
+ORPHAN_SWEEP_BATCH = 500
+
+async def _delete_user_data(user_ids: List[str]) -> Dict[str, int]:
+    """Remove os dados dos usuários numa transação; sem replica set, com deletes concorrentes"""
+    query = {"user_id": {"$in": user_ids}}
+    try:
+        async with await client.start_session() as session:
+            async with session.start_transaction():
+                # Uma sessão não aceita operações simultâneas: dentro da transação os deletes são sequenciais
+                counts = {}
+                for name in USER_DATA_COLLECTIONS:
+                    counts[name] = (await db[name].delete_many(query, session=session)).deleted_count
+                return counts
+    except OperationFailure as e:
+        # 20 = IllegalOperation: transações exigem replica set ou mongos
+        if e.code != 20:
+            raise
+    results = await asyncio.gather(*(db[name].delete_many(query) for name in USER_DATA_COLLECTIONS))
+    return {name: r.deleted_count for name, r in zip(USER_DATA_COLLECTIONS, results)}
+
+async def purge_users(keys: List[tuple]) -> Dict[str, int]:
+    """Limpa dados e linhas de leaderboard de usuários já excluídos"""
+    user_ids = [user_id for (user_id,) in keys]
+    # Nunca apaga dados de um usuário que (ainda ou de novo) existe
+    existing = set(await db.users.distinct("id", {"id": {"$in": user_ids}}))
+    user_ids = [uid for uid in user_ids if uid not in existing]
+    if not user_ids:
+        return {}
+    
+    counts = await _delete_user_data(user_ids)
+    periodos = await db.leaderboard.distinct("period", {"user_id": {"$in": user_ids}})
+    counts["leaderboard"] = (await db.leaderboard.delete_many({"user_id": {"$in": user_ids}})).deleted_count
+    for period in periodos:
+        await reordenar_leaderboard(period, leaderboard_period_key(period))
+    logger.info(f"Limpeza de {len(user_ids)} usuário(s) excluído(s): {counts}")
+    return counts
+
+user_cleanup_queue = DebouncedQueue(USER_CLEANUP_DEBOUNCE, purge_users, "limpeza de usuários")
+
+async def sweep_orphans() -> Dict[str, int]:
+    """Procura, em lotes, user_ids sem usuário correspondente e agenda a limpeza"""
+    found: Dict[str, int] = {}
+    for name in USER_DATA_COLLECTIONS + ("leaderboard",):
+        pipeline = [
+            {"$match": {"user_id": {"$type": "string"}}},
+            {"$group": {"_id": "$user_id"}},
+            {"$lookup": {"from": "users", "localField": "_id", "foreignField": "id", "pipeline": [{"$project": {"_id": 1}}], "as": "user"}},
+            {"$match": {"user": {"$size": 0}}},
+        ]
+        batch: List[str] = []
+        found[name] = 0
+        async for doc in db[name].aggregate(pipeline, batchSize=ORPHAN_SWEEP_BATCH):
+            batch.append(doc["_id"])
+            if len(batch) == ORPHAN_SWEEP_BATCH:
+                await purge_users([(uid,) for uid in batch])
+                found[name] += len(batch)
+                batch = []
+        if batch:
+            await purge_users([(uid,) for uid in batch])
+            found[name] += len(batch)
+    return found
+
+class OrphanSweeper:
+    """Tarefa periódica que executa sweep_orphans a cada `interval` segundos"""
+    
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.last_run: Optional[str] = None
+        self.last_result: Dict[str, int] = {}
+    
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def run_once(self) -> Dict[str, int]:
+        self.last_result = await sweep_orphans()
+        self.last_run = datetime.now(timezone.utc).isoformat()
+        self.runs += 1
+        return self.last_result
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Falha na varredura de órfãos: {e}")
+    
+    def stats(self) -> Dict:
+        return {
+            "interval_seconds": self.interval,
+            "runs": self.runs,
+            "last_run": self.last_run,
+            "last_result": self.last_result
+        }
+
+orphan_sweeper = OrphanSweeper(ORPHAN_SWEEP_INTERVAL)
+
+@api_router.get("/internal/db-stats")
+async def get_db_stats(current_user: User = Depends(require_admin)):
+    """Pool de conexões por servidor e histograma de latência por comando do MongoDB"""
+    return {
+        "config": {
+            "max_pool_size": MONGO_MAX_POOL_SIZE,
+            "min_pool_size": MONGO_MIN_POOL_SIZE,
+            "wait_queue_timeout_ms": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            "compressors": MONGO_COMPRESSORS,
+        },
+        "pool": pool_stats.snapshot(),
+        "commands": command_stats.snapshot(),
+    }
+
+@api_router.get("/internal/outbox")
+async def get_outbox_stats(current_user: User = Depends(require_admin)):
+    """Contadores do worker e emails do outbox por status"""
+    counts = await db.outbox.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]).to_list(None)
+    return {**outbox_worker.stats(), "by_status": {c["_id"]: c["count"] for c in counts}}
+
+@api_router.get("/internal/user-cleanup")
+async def get_user_cleanup_stats(current_user: User = Depends(require_admin)):
+    """Fila de limpeza de usuários excluídos e última varredura de órfãos"""
+    return {"queue": user_cleanup_queue.stats(), "sweeper": orphan_sweeper.stats()}
+
+@api_router.post("/internal/user-cleanup/sweep")
+async def run_orphan_sweep(current_user: User = Depends(require_admin)):
+    """Executa a varredura de órfãos imediatamente"""
+    return await orphan_sweeper.run_once()
+
+# ==================== IMPORTAÇÃO EM LOTE DE KPIs ====================
+
+KPI_BULK_BATCH_SIZE = 500
+
+async def _iter_lines(request: Request):
+    """Linhas do corpo da requisição, decodificadas à medida que chegam"""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig").rstrip("\r")
+    if buffer:
+        yield buffer.decode("utf-8-sig").rstrip("\r")
+
+async def _iter_bulk_rows(request: Request, fmt: str):
+    """(número da linha, dict) de um corpo CSV (com cabeçalho) ou NDJSON"""
+    header = None
+    row_number = 0
+    async for line in _iter_lines(request):
+        if not line.strip():
+            continue
+        if fmt == "csv" and header is None:
+            header = [h.strip() for h in next(csv.reader([line]))]
+            continue
+        row_number += 1
+        if fmt == "csv":
+            values = next(csv.reader([line]))
+            # Células vazias significam "não alterar"
+            yield row_number, {k: (v.strip() or None) for k, v in zip(header, values)}
+        else:
+            try:
+                yield row_number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield row_number, e
+
+async def _flush_kpi_batch(pending: Dict, errors: List[Dict]) -> Dict:
+    """Grava um lote de KPIs com bulk_write não ordenado e recalcula os bônus dependentes"""
+    user_ids = list({uid for uid, _ in pending})
+    users = await db.users.find({"id": {"$in": user_ids}}, {"_id": 0, "id": 1, "base_salary": 1}).to_list(None)
+    salaries = {u["id"]: u.get("base_salary", scoring.BASE_SALARY_DEFAULT) for u in users}
+    
+    operations, op_keys = [], []
+    for key, (rows, update_data) in pending.items():
+        user_id, month = key
+        if user_id not in salaries:
+            errors.extend({"row": r, "error": "Usuário não encontrado"} for r in rows)
+            continue
+        update_data = {**update_data, "updated_at": datetime.now(timezone.utc).isoformat()}
+        defaults = {
+            k: v for k, v in default_kpi_doc(user_id, month).items()
+            if k not in update_data and k not in ("user_id", "month")
+        }
+        operations.append(UpdateOne(
+            {"user_id": user_id, "month": month},
+            {"$set": update_data, "$setOnInsert": defaults},
+            upsert=True
+        ))
+        op_keys.append(key)
+    
+    result = {"updated": 0, "inserted": 0, "bonus_recomputed": 0, "written": []}
+    if not operations:
+        return result
+    
+    failed = set()
+    try:
+        write = await db.kpis.bulk_write(operations, ordered=False)
+        result["updated"] = write.modified_count
+        result["inserted"] = write.upserted_count
+    except BulkWriteError as e:
+        details = e.details
+        result["updated"] = details.get("nModified", 0)
+        result["inserted"] = details.get("nUpserted", 0)
+        for err in details.get("writeErrors", []):
+            key = op_keys[err["index"]]
+            failed.add(key)
+            errors.extend({"row": r, "error": err.get("errmsg", "Erro de escrita")} for r in pending[key][0])
+    
+    written = [k for k in op_keys if k not in failed]
+    result["written"] = written
+    for user_id, month in written:
+        invalidate_cached(f"/api/kpis/{user_id}/{month}")
+    
+    # Recalcula multiplicador e bônus final dos documentos de bônus existentes
+    result["bonus_recomputed"] = await recompute_bonus(written, salaries)
+    
+    return result
+
+@api_router.post("/kpis/bulk")
+async def bulk_import_kpis(request: Request, format: Optional[str] = None, current_user: User = Depends(require_admin)):
+    """Importa KPIs em lote a partir de um corpo CSV ou NDJSON transmitido em streaming"""
+    content_type = request.headers.get("content-type", "")
+    fmt = format or ("csv" if "csv" in content_type else "ndjson")
+    if fmt not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Formato inválido (use csv ou ndjson)")
+    
+    errors: List[Dict] = []
+    totals = {"processed": 0, "updated": 0, "inserted": 0, "bonus_recomputed": 0}
+    current_month = datetime.now().strftime("%Y-%m")
+    touches_current_month = False
+    
+    # (user_id, month) -> (linhas de origem, campos a gravar); linhas repetidas são mescladas
+    pending: Dict[tuple, tuple] = {}
+    
+    async def flush():
+        nonlocal touches_current_month
+        result = await _flush_kpi_batch(pending, errors)
+        for key in ("updated", "inserted", "bonus_recomputed"):
+            totals[key] += result[key]
+        touches_current_month |= any(month == current_month for _, month in result["written"])
+        await enqueue_rollups(result["written"])
+        for user_id, month in result["written"]:
+            badge_queue.enqueue(user_id, month)
+        for user_id in {uid for uid, _ in result["written"]}:
+            promotion_queue.enqueue(user_id)
+        pending.clear()
+    
+    async for row_number, raw in _iter_bulk_rows(request, fmt):
+        totals["processed"] += 1
+        if isinstance(raw, Exception):
+            errors.append({"row": row_number, "error": f"JSON inválido: {raw}"})
+            continue
+        try:
+            row = KPIBulkRow(**raw)
+        except (ValidationError, TypeError) as e:
+            errors.append({"row": row_number, "error": str(e)})
+            continue
+        
+        update_data = row.model_dump(exclude={"user_id", "month"}, exclude_none=True)
+        if not update_data:
+            errors.append({"row": row_number, "error": "Nenhum KPI para atualizar"})
+            continue
+        
+        rows, merged = pending.get((row.user_id, row.month), ([], {}))
+        pending[(row.user_id, row.month)] = (rows + [row_number], {**merged, **update_data})
+        if len(pending) >= KPI_BULK_BATCH_SIZE:
+            await flush()
+    
+    if pending:
+        await flush()
+    
+    if touches_current_month:
+        for period in LEADERBOARD_PERIODS:
+            await reconstruir_leaderboard(period)
+    
+    errors.sort(key=lambda e: e["row"])
+    return {**totals, "errors": errors}
+
+def default_bonus_doc(user_id: str, month: str) -> Dict:
+    import uuid
+    faixas = [
+        {"faixa": "15k+", "tpv_min": 15000, "bonus_per_client": 50, "meta_min_clients": 5, "clients_count": 0},
+        {"faixa": "30k+", "tpv_min": 30000, "bonus_per_client": 100, "meta_min_clients": 4, "clients_count": 0},
+        {"faixa": "50k+", "tpv_min": 50000, "bonus_per_client": 200, "meta_min_clients": 3, "clients_count": 0},
+        {"faixa": "100k+", "tpv_min": 100000, "bonus_per_client": 400, "meta_min_clients": 2, "clients_count": 0},
+        {"faixa": "200k+", "tpv_min": 200000, "bonus_per_client": 800, "meta_min_clients": 1, "clients_count": 0}
+    ]
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "month": month,
+        "faixas": faixas,
+        "bonus_total": 0.0,
+        "multiplicador": 0.0,
+        "bonus_final": 0.0,
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+
+@api_router.get("/bonus/{user_id}/{month}", dependencies=[Depends(not_modified)])
 async def get_bonus(user_id: str, month: str, current_user: User = Depends(get_current_user)):
     if current_user.role != UserRole.ADMIN and current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Acesso negado")
     
-    bonus = await db.bonus.find_one({"user_id": user_id, "month": month}, {"_id": 0})
-    if not bonus:
-        import uuid
-        faixas = [
-            {"faixa": "15k+", "tpv_min": 15000, "bonus_per_client": 50, "meta_min_clients": 5, "clients_count": 0},
-            {"faixa": "30k+", "tpv_min": 30000, "bonus_per_client": 100, "meta_min_clients": 4, "clients_count": 0},
-            {"faixa": "50k+", "tpv_min": 50000, "bonus_per_client": 200, "meta_min_clients": 3, "clients_count": 0},
-            {"faixa": "100k+", "tpv_min": 100000, "bonus_per_client": 400, "meta_min_clients": 2, "clients_count": 0},
-            {"faixa": "200k+", "tpv_min": 200000, "bonus_per_client": 800, "meta_min_clients": 1, "clients_count": 0}
-        ]
-        bonus_doc = {
-            "id": str(uuid.uuid4()),
-            "user_id": user_id,
-            "month": month,
-            "faixas": faixas,
-            "bonus_total": 0.0,
-            "multiplicador": 0.0,
-            "bonus_final": 0.0,
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }
-        await db.bonus.insert_one(bonus_doc)
-        bonus = await db.bonus.find_one({"user_id": user_id, "month": month}, {"_id": 0})
-    return bonus
+    return await get_or_create(db.bonus, {"user_id": user_id, "month": month}, default_bonus_doc(user_id, month))
 
 @api_router.put("/bonus/{user_id}/{month}")
 async def update_bonus(user_id: str, month: str, update: BonusUpdate, current_user: User = Depends(require_admin)):
@@ -666,33 +2065,12 @@ async def update_bonus(user_id: str, month: str, update: BonusUpdate, current_us
     bonus_total = sum(f["bonus_per_client"] * f["clients_count"] for f in update.faixas)
     
     kpi = await db.kpis.find_one({"user_id": user_id, "month": month}, {"_id": 0})
-    multiplicador = 0.0
-    if kpi:
-        atingimento_geral = 0.0
-        weights = {"novos_ativos": 0.3, "churn": 0.2, "tpv_m1": 0.2, "ativos_m1": 0.15, "migracao_hunter": 0.15}
-        
-        if kpi["novos_ativos_meta"] > 0:
-            atingimento_geral += (kpi["novos_ativos_realizado"] / kpi["novos_ativos_meta"]) * weights["novos_ativos"]
-        if kpi["churn_meta"] > 0:
-            churn_perc = (1 - (kpi["churn_realizado"] / kpi["churn_meta"])) if kpi["churn_realizado"] < kpi["churn_meta"] else 0
-            atingimento_geral += churn_perc * weights["churn"]
-        if kpi["tpv_m1_meta"] > 0:
-            atingimento_geral += (kpi["tpv_m1_realizado"] / kpi["tpv_m1_meta"]) * weights["tpv_m1"]
-        if kpi["ativos_m1_meta"] > 0:
-            atingimento_geral += (kpi["ativos_m1_realizado"] / kpi["ativos_m1_meta"]) * weights["ativos_m1"]
-        if kpi["migracao_hunter_meta"] > 0:
-            atingimento_geral += (kpi["migracao_hunter_realizado"] / kpi["migracao_hunter_meta"]) * weights["migracao_hunter"]
-        
-        if atingimento_geral >= 1.0:
-            multiplicador = 1.0
-        elif atingimento_geral >= 0.8:
-            multiplicador = 0.8
-        else:
-            multiplicador = 0.0
-    
     user = await db.users.find_one({"id": user_id}, {"_id": 0})
-    base_salary = user.get("base_salary", 1570.0) if user else 1570.0
-    bonus_final = min(bonus_total * multiplicador, base_salary * 2)
+    base_salary = user.get("base_salary", scoring.BASE_SALARY_DEFAULT) if user else scoring.BASE_SALARY_DEFAULT
+    
+    score = scoring.score_team([kpi], [bonus_total], [base_salary])
+    multiplicador = float(score["multiplicador"][0])
+    bonus_final = float(score["bonus_final"][0])
     
     update_data = {
         "faixas": [f.model_dump() for f in update.faixas],
@@ -706,25 +2084,31 @@ async def update_bonus(user_id: str, month: str, update: BonusUpdate, current_us
     updated_bonus = await db.bonus.find_one({"user_id": user_id, "month": month}, {"_id": 0})
     return updated_bonus
 
+def default_extrato_doc(user_id: str, month: str) -> Dict:
+    import uuid
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "month": month,
+        "bonus_time": 0.0,
+        "bonus_rentabilizacao": 0.0,
+        "historico_semestral": [],
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+
 @api_router.get("/extrato/{user_id}/{month}")
 async def get_extrato(user_id: str, month: str, current_user: User = Depends(get_current_user)):
     if current_user.role != UserRole.ADMIN and current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Acesso negado")
+    if not re.fullmatch(MONTH_PATTERN, month):
+        raise HTTPException(status_code=400, detail="Mês inválido (use YYYY-MM)")
     
-    extrato = await db.extrato.find_one({"user_id": user_id, "month": month}, {"_id": 0})
-    if not extrato:
-        import uuid
-        extrato_doc = {
-            "id": str(uuid.uuid4()),
-            "user_id": user_id,
-            "month": month,
-            "bonus_time": 0.0,
-            "bonus_rentabilizacao": 0.0,
-            "historico_semestral": [],
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }
-        await db.extrato.insert_one(extrato_doc)
-        extrato = await db.extrato.find_one({"user_id": user_id, "month": month}, {"_id": 0})
+    extrato, historico = await asyncio.gather(
+        get_or_create(db.extrato, {"user_id": user_id, "month": month}, default_extrato_doc(user_id, month)),
+        historico_semestral(user_id, month),
+    )
+    # Derivado dos KPIs/bônus a cada leitura; não é gravado no documento
+    extrato["historico_semestral"] = historico
     return extrato
 
 @api_router.post("/dre/{user_id}")
@@ -761,30 +2145,28 @@ async def get_dre_list(user_id: str, current_user: User = Depends(get_current_us
     dres = await db.dre.find({"user_id": user_id}, {"_id": 0}).to_list(1000)
     return dres
 
-@api_router.get("/forecast/{user_id}/{month}")
+def default_forecast_doc(user_id: str, month: str) -> Dict:
+    import uuid
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "month": month,
+        "qualificacao": 0,
+        "proposta": 0,
+        "novo_cliente": 0,
+        "novo_ativo": 0,
+        "conv_qualif_proposta": 0.0,
+        "conv_proposta_cliente": 0.0,
+        "conv_cliente_ativo": 0.0,
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+
+@api_router.get("/forecast/{user_id}/{month}", dependencies=[Depends(not_modified)])
 async def get_forecast(user_id: str, month: str, current_user: User = Depends(get_current_user)):
     if current_user.role != UserRole.ADMIN and current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Acesso negado")
     
-    forecast = await db.forecast.find_one({"user_id": user_id, "month": month}, {"_id": 0})
-    if not forecast:
-        import uuid
-        forecast_doc = {
-            "id": str(uuid.uuid4()),
-            "user_id": user_id,
-            "month": month,
-            "qualificacao": 0,
-            "proposta": 0,
-            "novo_cliente": 0,
-            "novo_ativo": 0,
-            "conv_qualif_proposta": 0.0,
-            "conv_proposta_cliente": 0.0,
-            "conv_cliente_ativo": 0.0,
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }
-        await db.forecast.insert_one(forecast_doc)
-        forecast = await db.forecast.find_one({"user_id": user_id, "month": month}, {"_id": 0})
-    return forecast
+    return await get_or_create(db.forecast, {"user_id": user_id, "month": month}, default_forecast_doc(user_id, month))
 
 @api_router.put("/forecast/{user_id}/{month}")
 async def update_forecast(user_id: str, month: str, update: ForecastUpdate, current_user: User = Depends(require_admin)):
@@ -812,28 +2194,26 @@ async def update_forecast(user_id: str, month: str, update: ForecastUpdate, curr
     updated_forecast = await db.forecast.find_one({"user_id": user_id, "month": month}, {"_id": 0})
     return updated_forecast
 
-@api_router.get("/competencias/{user_id}")
+def default_competencias_doc(user_id: str) -> Dict:
+    import uuid
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "persistencia": 3,
+        "influencia": 3,
+        "relacionamento": 3,
+        "organizacao": 3,
+        "criatividade": 3,
+        "media": 3.0,
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+
+@api_router.get("/competencias/{user_id}", dependencies=[Depends(not_modified)])
 async def get_competencias(user_id: str, current_user: User = Depends(get_current_user)):
     if current_user.role != UserRole.ADMIN and current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Acesso negado")
     
-    comp = await db.competencias.find_one({"user_id": user_id}, {"_id": 0})
-    if not comp:
-        import uuid
-        comp_doc = {
-            "id": str(uuid.uuid4()),
-            "user_id": user_id,
-            "persistencia": 3,
-            "influencia": 3,
-            "relacionamento": 3,
-            "organizacao": 3,
-            "criatividade": 3,
-            "media": 3.0,
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }
-        await db.competencias.insert_one(comp_doc)
-        comp = await db.competencias.find_one({"user_id": user_id}, {"_id": 0})
-    return comp
+    return await get_or_create(db.competencias, {"user_id": user_id}, default_competencias_doc(user_id))
 
 @api_router.put("/competencias/{user_id}")
 async def update_competencias(user_id: str, update: CompetenciaUpdate, current_user: User = Depends(get_current_user)):
@@ -860,40 +2240,43 @@ async def update_competencias(user_id: str, update: CompetenciaUpdate, current_u
     updated_comp = await db.competencias.find_one({"user_id": user_id}, {"_id": 0})
     return updated_comp
 
+async def _timed(name: str, coro, timings: Dict[str, float]):
+    """Aguarda a consulta registrando sua duração (ms) em timings"""
+    inicio = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[name] = (time.perf_counter() - inicio) * 1000
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={dur:.1f}" for name, dur in timings.items())
+
 @api_router.get("/dashboard/{user_id}")
-async def get_dashboard(user_id: str, current_user: User = Depends(get_current_user)):
+async def get_dashboard(
+    user_id: str,
+    response: Response,
+    month: Optional[str] = Query(None, pattern=MONTH_PATTERN),
+    current_user: User = Depends(get_current_user)
+):
     if current_user.role != UserRole.ADMIN and current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Acesso negado")
     
-    from datetime import datetime
-    current_month = datetime.now().strftime("%Y-%m")
-    
-    user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
-    kpi = await db.kpis.find_one({"user_id": user_id, "month": current_month}, {"_id": 0})
-    bonus = await db.bonus.find_one({"user_id": user_id, "month": current_month}, {"_id": 0})
-    forecast = await db.forecast.find_one({"user_id": user_id, "month": current_month}, {"_id": 0})
-    competencias = await db.competencias.find_one({"user_id": user_id}, {"_id": 0})
+    current_month = month or datetime.now().strftime("%Y-%m")
+    
+    # Consultas independentes em paralelo: a latência é a da mais lenta, não a soma
+    timings: Dict[str, float] = {}
+    user, kpi, bonus, forecast, competencias = await asyncio.gather(
+        _timed("users", db.users.find_one({"id": user_id}, USER_PROJECTION), timings),
+        _timed("kpis", get_or_create(
+            db.kpis, {"user_id": user_id, "month": current_month}, default_kpi_doc(user_id, current_month)
+        ), timings),
+        _timed("bonus", db.bonus.find_one({"user_id": user_id, "month": current_month}, {"_id": 0}), timings),
+        _timed("forecast", db.forecast.find_one({"user_id": user_id, "month": current_month}, {"_id": 0}), timings),
+        _timed("competencias", db.competencias.find_one({"user_id": user_id}, {"_id": 0}), timings),
+    )
     
-    if not kpi:
-        import uuid
-        kpi_doc = {
-            "id": str(uuid.uuid4()),
-            "user_id": user_id,
-            "month": current_month,
-            "novos_ativos_meta": 12,
-            "novos_ativos_realizado": 0,
-            "churn_meta": 5.0,
-            "churn_realizado": 0.0,
-            "tpv_m1_meta": 100000.0,
-            "tpv_m1_realizado": 0.0,
-            "ativos_m1_meta": 10,
-            "ativos_m1_realizado": 0,
-            "migracao_hunter_meta": 70.0,
-            "migracao_hunter_realizado": 0.0,
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }
-        await db.kpis.insert_one(kpi_doc)
-        kpi = await db.kpis.find_one({"user_id": user_id, "month": current_month}, {"_id": 0})
+    # Tempo de cada subconsulta visível no DevTools (aba Timing)
+    response.headers["Server-Timing"] = server_timing_header(timings)
     
     return {
         "user": user,
@@ -903,6 +2286,211 @@ async def get_dashboard(user_id: str, current_user: User = Depends(get_current_u
         "competencias": competencias
     }
 
+# ==================== EXPORTAÇÃO ====================
+
+EXPORT_MODELS = {"kpis": KPI, "bonus": Bonus, "dre": DRE, "forecast": Forecast}
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+EXPORT_BATCH_SIZE = 500
+
+def _export_value(value):
+    # Listas (ex.: faixas do bônus) viram JSON dentro da célula
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=str)
+    return "" if value is None else value
+
+async def _export_rows(cursor, columns: List[str], fmt: str):
+    """Texto CSV/NDJSON em blocos de EXPORT_BATCH_SIZE documentos, sem acumular o cursor"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == "csv":
+        writer.writerow(columns)
+    count = 0
+    async for doc in cursor:
+        if fmt == "csv":
+            writer.writerow([_export_value(doc.get(c)) for c in columns])
+        else:
+            buffer.write(json.dumps({c: doc.get(c) for c in columns}, default=str))
+            buffer.write("\n")
+        count += 1
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+async def _gzip_stream(chunks):
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+@api_router.get("/export/{collection}")
+async def export_history(
+    collection: str,
+    month_from: Optional[str] = Query(None, alias="from", pattern=MONTH_PATTERN),
+    month_to: Optional[str] = Query(None, alias="to", pattern=MONTH_PATTERN),
+    format: str = "csv",
+    gzip: bool = False,
+    user_id: Optional[str] = None,
+    current_user: User = Depends(require_admin)
+):
+    """Exporta o histórico de uma coleção em CSV ou NDJSON direto do cursor, em streaming"""
+    model = EXPORT_MODELS.get(collection)
+    if not model:
+        raise HTTPException(status_code=404, detail="Coleção não exportável")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Formato inválido (use csv ou ndjson)")
+    
+    query = month_range(month_from, month_to)
+    if user_id:
+        query["user_id"] = user_id
+    
+    columns = list(model.model_fields)
+    cursor = (
+        db[collection]
+        .find(query, {"_id": 0, **{c: 1 for c in columns}})
+        .sort([("month", 1), ("user_id", 1)])
+        .batch_size(EXPORT_BATCH_SIZE)
+    )
+    
+    filename = f"{collection}_{month_from or 'inicio'}_{month_to or 'fim'}.{format}"
+    body = _export_rows(cursor, columns, format)
+    media_type = EXPORT_FORMATS[format]
+    if gzip:
+        body = _gzip_stream(body)
+        filename += ".gz"
+        media_type = "application/gzip"
+    
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# ==================== VISÃO GERAL (ADMIN) ====================
+
+OVERVIEW_PAGE_SIZE = 200
+OVERVIEW_CHUNK_SIZE = 50
+
+async def _overview_chunk(agents: List[Dict], month: str) -> List[Dict]:
+    """KPI, bônus e forecast de um lote de agentes com três consultas $in concorrentes"""
+    ids = [a["id"] for a in agents]
+    query = {"user_id": {"$in": ids}, "month": month}
+    kpis, bonus, forecasts = await asyncio.gather(
+        db.kpis.find(query, {"_id": 0}).to_list(None),
+        db.bonus.find(query, {"_id": 0}).to_list(None),
+        db.forecast.find(query, {"_id": 0}).to_list(None),
+    )
+    kpis_by_user = {k["user_id"]: k for k in kpis}
+    
+    # Agentes sem KPI no mês recebem o documento padrão só na resposta: o GET não grava
+    # (a edição pelo painel cria o documento via PUT)
+    for uid in ids:
+        if uid not in kpis_by_user:
+            kpis_by_user[uid] = default_kpi_doc(uid, month)
+    
+    bonus_by_user = {b["user_id"]: b for b in bonus}
+    forecast_by_user = {f["user_id"]: f for f in forecasts}
+    
+    agent_kpis = [kpis_by_user.get(a["id"]) for a in agents]
+    atingimentos = scoring.score_team(agent_kpis)["atingimento"]
+    
+    items = []
+    for agent, kpi, ating in zip(agents, agent_kpis, atingimentos):
+        items.append({
+            **agent,
+            "kpis": kpi,
+            "bonus": bonus_by_user.get(agent["id"]),
+            "forecast": forecast_by_user.get(agent["id"]),
+            "atingimento": round(float(ating), 1)
+        })
+    return items
+
+@api_router.get("/admin/overview")
+async def get_admin_overview(
+    month: Optional[str] = Query(None, pattern=MONTH_PATTERN),
+    cursor: Optional[str] = None,
+    limit: int = OVERVIEW_PAGE_SIZE,
+    current_user: User = Depends(require_admin)
+):
+    """Agentes ativos com KPI, bônus, forecast e atingimento do mês, paginados por id"""
+    month = month or datetime.now().strftime("%Y-%m")
+    limit = max(1, min(limit, OVERVIEW_PAGE_SIZE))
+    
+    query = {"role": "agent", "archived": {"$ne": True}}
+    if cursor:
+        query["id"] = {"$gt": cursor}
+    agents_cursor = db.users.find(query, USER_PROJECTION).sort("id", 1).limit(limit + 1)
+    
+    async def stream():
+        yield f'{{"month": {json.dumps(month)}, "items": ['
+        chunk, count, first, has_more, last_id = [], 0, True, False, None
+        async for agent in agents_cursor:
+            if count == limit:
+                has_more = True
+                break
+            chunk.append(agent)
+            count += 1
+            last_id = agent["id"]
+            if len(chunk) == OVERVIEW_CHUNK_SIZE:
+                for item in await _overview_chunk(chunk, month):
+                    yield ("" if first else ",") + json.dumps(item, default=str)
+                    first = False
+                chunk = []
+        if chunk:
+            for item in await _overview_chunk(chunk, month):
+                yield ("" if first else ",") + json.dumps(item, default=str)
+                first = False
+        
+        next_cursor = last_id if has_more else None
+        yield f'], "next_cursor": {json.dumps(next_cursor)}}}'
+    
+    return StreamingResponse(stream(), media_type="application/json")
+
+# ==================== FECHAMENTO DE MÊS ====================
+
+_month_close_tasks: Dict[str, asyncio.Task] = {}
+
+async def _run_month_close(month: str, force: bool):
+    from close_month import run_month_close
+    try:
+        await run_month_close(
+            db, month, BADGE_DEFINITIONS, force=force, logger=logger,
+            on_written=lambda user_ids: invalidate_user_months("bonus", user_ids, month),
+        )
+        # Pontos de badges mudaram: reconstrói os leaderboards atuais
+        for period in LEADERBOARD_PERIODS:
+            await reconstruir_leaderboard(period)
+    except Exception as e:
+        logger.error(f"Falha no fechamento de {month}: {e}")
+        await db.month_close_checkpoints.update_one({"_id": month}, {"$set": {"error": str(e)}})
+    finally:
+        _month_close_tasks.pop(month, None)
+
+@api_router.post("/admin/close-month/{month}", status_code=202)
+async def close_month(month: str, force: bool = False, current_user: User = Depends(require_admin)):
+    """Inicia (ou retoma) o fechamento do mês para toda a equipe em segundo plano"""
+    if not re.fullmatch(MONTH_PATTERN, month):
+        raise HTTPException(status_code=400, detail="Mês inválido (use YYYY-MM)")
+    if month in _month_close_tasks:
+        raise HTTPException(status_code=409, detail="Fechamento deste mês já está em andamento")
+    
+    _month_close_tasks[month] = asyncio.create_task(_run_month_close(month, force))
+    return {"message": "Fechamento iniciado", "month": month}
+
+@api_router.get("/admin/close-month/{month}")
+async def get_month_close_status(month: str, current_user: User = Depends(require_admin)):
+    """Progresso (checkpoint) do fechamento do mês"""
+    checkpoint = await db.month_close_checkpoints.find_one({"_id": month})
+    if not checkpoint:
+        raise HTTPException(status_code=404, detail="Mês ainda não fechado")
+    checkpoint["month"] = checkpoint.pop("_id")
+    checkpoint["running"] = month in _month_close_tasks
+    return checkpoint
+
 # ==================== GAMIFICAÇÃO ====================
 
 BADGE_DEFINITIONS = {
@@ -929,25 +2517,7 @@ async def get_user_gamification(user_id: str, current_user: User = Depends(get_c
     if current_user.role != UserRole.ADMIN and current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Acesso negado")
     
-    gamification = await db.gamification.find_one({"user_id": user_id}, {"_id": 0})
-    
-    if not gamification:
-        import uuid
-        gamification = {
-            "id": str(uuid.uuid4()),
-            "user_id": user_id,
-            "total_points": 0,
-            "badges": [],
-            "weekly_ranking": 0,
-            "monthly_ranking": 0,
-            "streak_months": 0,
-            "achievements": [],
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }
-        await db.gamification.insert_one(gamification)
-        gamification.pop("_id", None)
-    
-    return gamification
+    return await get_or_create(db.gamification, {"user_id": user_id}, badges.gamification_defaults(user_id))
 
 @api_router.post("/gamification/award-badge/{user_id}")
 async def award_badge(user_id: str, badge_id: str, current_user: User = Depends(require_admin)):
@@ -956,68 +2526,202 @@ async def award_badge(user_id: str, badge_id: str, current_user: User = Depends(
         raise HTTPException(status_code=400, detail="Badge não encontrada")
     
     badge = BADGE_DEFINITIONS[badge_id]
-    badge_award = {
-        "badge_id": badge_id,
-        "awarded_at": datetime.now(timezone.utc).isoformat(),
-        "awarded_by": current_user.id
-    }
+    await get_or_create(db.gamification, {"user_id": user_id}, badges.gamification_defaults(user_id))
+    
+    month = datetime.now().strftime("%Y-%m")
+    result = await db.gamification.update_one(
+        *badges.badge_update(user_id, badge_id, badge["points"], month, current_user.id)
+    )
+    if result.modified_count == 0:
+        raise HTTPException(status_code=400, detail="Usuário já possui esta badge")
     
-    await db.gamification.update_one(
+    # Pontos não alteram a ordenação: basta incrementar as linhas do usuário
+    await db.leaderboard.update_many(
         {"user_id": user_id},
-        {
-            "$push": {"badges": badge_award, "achievements": badge_award},
-            "$inc": {"total_points": badge["points"]}
-        },
-        upsert=True
+        {"$inc": {"total_points": badge["points"], "badges_count": 1}}
     )
     
     return {"message": f"Badge '{badge['name']}' concedida!", "points": badge["points"]}
 
+# Motor de regras: avalia sequências e badges automáticas a cada escrita de KPI
+
+BADGE_EVAL_CHUNK_SIZE = 500
+
+async def evaluate_badges(pairs: List[tuple]) -> int:
+    """Avalia badges automáticas para os pares (user_id, month), um mês e lote por vez"""
+    by_month: Dict[str, List[str]] = {}
+    for user_id, month in pairs:
+        by_month.setdefault(month, []).append(user_id)
+    badge_points = {b: BADGE_DEFINITIONS[b]["points"] for b in badges.AUTO_BADGES}
+    
+    awarded = 0
+    for month in sorted(by_month):
+        ids = list(dict.fromkeys(by_month[month]))
+        for start in range(0, len(ids), BADGE_EVAL_CHUNK_SIZE):
+            chunk = ids[start:start + BADGE_EVAL_CHUNK_SIZE]
+            kpis, gamification = await asyncio.gather(
+                db.kpis.find({"user_id": {"$in": chunk}, "month": month}, {"_id": 0}).to_list(None),
+                db.gamification.find(
+                    {"user_id": {"$in": chunk}},
+                    {"_id": 0, "user_id": 1, "badges.badge_id": 1, **{f: 1 for f in badges.STREAK_FIELDS}}
+                ).to_list(None),
+            )
+            kpis_by_user = {k["user_id"]: k for k in kpis}
+            state_by_user = {g["user_id"]: g for g in gamification}
+            
+            agent_kpis = [kpis_by_user.get(uid) for uid in chunk]
+            meta, realizado, present = scoring.kpi_matrix(agent_kpis)
+            atingimentos = scoring.atingimento(meta, realizado, present)
+            perfeito = (scoring.atingimento_por_kpi(meta, realizado) >= 100).all(axis=1) & present
+            
+            results = []
+            for uid, kpi, ating, perfect in zip(chunk, agent_kpis, atingimentos, perfeito):
+                streaks, earned = badges.evaluate(month, kpi, float(ating), bool(perfect), state_by_user.get(uid))
+                results.append({"user_id": uid, "streaks": streaks, "badges": earned})
+            awarded += await badges.apply_results(db, month, results, badge_points, "rules")
+    return awarded
+
+badge_queue = DebouncedQueue(BONUS_RECOMPUTE_DEBOUNCE, evaluate_badges, "avaliação de badges")
+
+@api_router.post("/admin/badges/evaluate/{month}")
+async def evaluate_team_badges(month: str, current_user: User = Depends(require_admin)):
+    """Avalia as badges automáticas de todos os agentes ativos no mês"""
+    if not re.fullmatch(MONTH_PATTERN, month):
+        raise HTTPException(status_code=400, detail="Mês inválido (use YYYY-MM)")
+    agents = await db.users.find({"role": "agent", "archived": {"$ne": True}}, {"_id": 0, "id": 1}).to_list(None)
+    awarded = await evaluate_badges([(a["id"], month) for a in agents])
+    return {"month": month, "evaluated": len(agents), "badges_awarded": awarded}
+
+def ranking_pipeline(month: str, user_id: Optional[str] = None) -> List[Dict]:
+    """Pipeline único: agentes + KPIs do mês + gamificação, com atingimento calculado no Mongo"""
+    match = {"role": "agent", "archived": {"$ne": True}}
+    if user_id is not None:
+        match["id"] = user_id
+    
+    return [
+        {"$match": match},
+        {"$lookup": {
+            "from": "kpis",
+            "localField": "id",
+            "foreignField": "user_id",
+            "pipeline": [{"$match": {"month": month}}, {"$limit": 1}],
+            "as": "kpi"
+        }},
+        {"$lookup": {
+            "from": "gamification",
+            "localField": "id",
+            "foreignField": "user_id",
+            "pipeline": [{"$limit": 1}, {"$project": {"_id": 0, "total_points": 1, "badges": 1, "streak_months": 1}}],
+            "as": "gamification"
+        }},
+        {"$project": {
+            "_id": 0,
+            "id": 1,
+            "name": 1,
+            "career_level": 1,
+            "kpi": {"$first": "$kpi"},
+            "gamification": {"$first": "$gamification"}
+        }},
+        {"$project": {
+            "user_id": "$id",
+            "name": 1,
+            "career_level": {"$ifNull": ["$career_level", "Recruta"]},
+            "atingimento": {"$round": [scoring.atingimento_mongo_expr("$kpi"), 1]},
+            "total_points": {"$ifNull": ["$gamification.total_points", 0]},
+            "badges_count": {"$size": {"$ifNull": ["$gamification.badges", []]}},
+            "streak_months": {"$ifNull": ["$gamification.streak_months", 0]}
+        }},
+        {"$sort": {"atingimento": -1, "user_id": 1}}
+    ]
+
+# ==================== LEADERBOARD MATERIALIZADO ====================
+
+LEADERBOARD_PERIODS = ("monthly", "weekly")
+
+def leaderboard_period_key(period: str, now: Optional[datetime] = None) -> str:
+    """Chave do período: mês (YYYY-MM) ou semana ISO (YYYY-Www)"""
+    now = now or datetime.now()
+    if period == "weekly":
+        return now.strftime("%G-W%V")
+    return now.strftime("%Y-%m")
+
+async def materializar_leaderboard(period: str, user_id: Optional[str] = None, now: Optional[datetime] = None):
+    """Grava no leaderboard as linhas do período atual (de um agente ou de toda a equipe)"""
+    now = now or datetime.now()
+    period_key = leaderboard_period_key(period, now)
+    current_month = now.strftime("%Y-%m")
+    
+    pipeline = ranking_pipeline(current_month, user_id) + [
+        {"$addFields": {
+            "period": period,
+            "period_key": period_key,
+            "month": current_month,
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }},
+        {"$merge": {
+            "into": "leaderboard",
+            "on": ["period", "period_key", "user_id"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }}
+    ]
+    await db.users.aggregate(pipeline).to_list(None)
+    await reordenar_leaderboard(period, period_key)
+
+async def reordenar_leaderboard(period: str, period_key: str):
+    """Recalcula as posições do período inteiramente no servidor"""
+    pipeline = [
+        {"$match": {"period": period, "period_key": period_key}},
+        {"$setWindowFields": {
+            "sortBy": {"atingimento": -1, "user_id": 1},
+            "output": {"position": {"$documentNumber": {}}}
+        }},
+        {"$project": {"_id": 1, "position": 1}},
+        {"$merge": {"into": "leaderboard", "on": "_id", "whenMatched": "merge", "whenNotMatched": "discard"}}
+    ]
+    await db.leaderboard.aggregate(pipeline).to_list(None)
+
+async def reconstruir_leaderboard(period: str, now: Optional[datetime] = None):
+    """Reconstrói o período atual do zero (período novo ou leaderboard vazio)"""
+    now = now or datetime.now()
+    await db.leaderboard.delete_many({"period": period, "period_key": leaderboard_period_key(period, now)})
+    await materializar_leaderboard(period, now=now)
+
+async def atualizar_leaderboard_usuario(user_id: str, now: Optional[datetime] = None):
+    """Atualiza incrementalmente as linhas de um usuário em todos os períodos atuais"""
+    now = now or datetime.now()
+    for period in LEADERBOARD_PERIODS:
+        period_key = leaderboard_period_key(period, now)
+        if not await db.leaderboard.find_one({"period": period, "period_key": period_key}, {"_id": 1}):
+            # Primeira escrita de um mês/semana novo: materializa a equipe inteira, senão o
+            # ranking do período ficaria só com este usuário (get_ranking só reconstrói se vazio)
+            await reconstruir_leaderboard(period, now)
+            continue
+        # Remove a linha atual; se o usuário ainda for um agente ativo, ela é regravada
+        await db.leaderboard.delete_one({"period": period, "period_key": period_key, "user_id": user_id})
+        await materializar_leaderboard(period, user_id, now)
+
+async def remover_usuario_leaderboard(user_id: str):
+    """Remove o usuário dos leaderboards e reordena os períodos afetados"""
+    periodos = await db.leaderboard.distinct("period", {"user_id": user_id})
+    await db.leaderboard.delete_many({"user_id": user_id})
+    for period in periodos:
+        await reordenar_leaderboard(period, leaderboard_period_key(period))
+
 @api_router.get("/gamification/ranking")
 async def get_ranking(period: str = "monthly", current_user: User = Depends(get_current_user)):
     """Retorna ranking de vendedores"""
-    current_month = datetime.now().strftime("%Y-%m")
-    
-    # Buscar todos os usuários agentes
-    agents = await db.users.find({"role": "agent", "archived": {"$ne": True}}, {"_id": 0, "password": 0}).to_list(1000)
+    if period not in LEADERBOARD_PERIODS:
+        raise HTTPException(status_code=400, detail="Período inválido")
     
-    ranking_data = []
-    for agent in agents:
-        kpi = await db.kpis.find_one({"user_id": agent["id"], "month": current_month}, {"_id": 0})
-        gamification = await db.gamification.find_one({"user_id": agent["id"]}, {"_id": 0})
-        
-        # Calcular atingimento
-        atingimento = 0
-        if kpi:
-            weights = {"novos_ativos": 0.3, "churn": 0.2, "tpv_m1": 0.2, "ativos_m1": 0.15, "migracao_hunter": 0.15}
-            if kpi.get("novos_ativos", 0) > 0:
-                atingimento += (kpi.get("novos_ativos_realizado", 0) / kpi.get("novos_ativos", 1)) * 100 * weights["novos_ativos"]
-            if kpi.get("churn", 0) > 0:
-                churn_at = max(0, ((kpi.get("churn", 5) - kpi.get("churn_realizado", 0)) / kpi.get("churn", 5) + 1)) * 100
-                atingimento += min(churn_at, 200) * weights["churn"]
-            if kpi.get("tpv_m1", 0) > 0:
-                atingimento += (kpi.get("tpv_m1_realizado", 0) / kpi.get("tpv_m1", 1)) * 100 * weights["tpv_m1"]
-            if kpi.get("ativos_m1", 0) > 0:
-                atingimento += (kpi.get("ativos_m1_realizado", 0) / kpi.get("ativos_m1", 1)) * 100 * weights["ativos_m1"]
-            if kpi.get("migracao_hunter", 0) > 0:
-                atingimento += (kpi.get("migracao_hunter_realizado", 0) / kpi.get("migracao_hunter", 1)) * 100 * weights["migracao_hunter"]
-        
-        ranking_data.append({
-            "user_id": agent["id"],
-            "name": agent["name"],
-            "career_level": agent.get("career_level", "Recruta"),
-            "atingimento": round(atingimento, 1),
-            "total_points": gamification.get("total_points", 0) if gamification else 0,
-            "badges_count": len(gamification.get("badges", [])) if gamification else 0,
-            "streak_months": gamification.get("streak_months", 0) if gamification else 0,
-        })
+    query = {"period": period, "period_key": leaderboard_period_key(period)}
+    projection = {"_id": 0, "period": 0, "period_key": 0, "month": 0, "updated_at": 0}
     
-    # Ordenar por atingimento
-    ranking_data.sort(key=lambda x: x["atingimento"], reverse=True)
-    
-    # Adicionar posição
-    for i, item in enumerate(ranking_data):
-        item["position"] = i + 1
+    # Leitura única, ordenada pelo índice (period, period_key, position)
+    ranking_data = await db.leaderboard.find(query, projection).sort("position", 1).to_list(None)
+    if not ranking_data:
+        await reconstruir_leaderboard(period)
+        ranking_data = await db.leaderboard.find(query, projection).sort("position", 1).to_list(None)
     
     return ranking_data
 
@@ -1086,18 +2790,76 @@ CAREER_LEVELS_DEFAULT = [
     }
 ]
 
-@api_router.get("/career-levels")
-async def get_career_levels(current_user: User = Depends(get_current_user)):
-    """Retorna configuração de níveis de carreira"""
-    levels = await db.career_levels.find({}, {"_id": 0}).sort("order", 1).to_list(100)
+CAREER_LEVELS_POLL = float(os.environ.get('CAREER_LEVELS_POLL', '30'))
+
+class CareerLevelCache:
+    """Plano de carreira em memória, versionado por um documento em config_versions.
     
-    if not levels:
-        # Inicializar com valores padrão
-        for level in CAREER_LEVELS_DEFAULT:
-            await db.career_levels.insert_one(level)
-        levels = CAREER_LEVELS_DEFAULT
+    Escritas neste worker recarregam na hora; os demais percebem a nova versão
+    ao consultar o documento de versão, no máximo a cada `poll` segundos.
+    """
     
-    return levels
+    VERSION_ID = "career_levels"
+    
+    def __init__(self, poll: float):
+        self.poll = poll
+        self.levels: Optional[List[Dict]] = None
+        self.version: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        self.reloads = 0
+    
+    async def _current_version(self) -> int:
+        doc = await db.config_versions.find_one({"_id": self.VERSION_ID})
+        return doc["version"] if doc else 0
+    
+    async def load(self):
+        levels = await db.career_levels.find({}, {"_id": 0}).sort("order", 1).to_list(100)
+        if not levels:
+            # Inicializar com valores padrão numa única escrita
+            try:
+                await db.career_levels.insert_many([dict(level) for level in CAREER_LEVELS_DEFAULT], ordered=False)
+            except BulkWriteError:
+                # Outro worker semeou ao mesmo tempo: o índice único de id descarta as duplicatas
+                pass
+            levels = await db.career_levels.find({}, {"_id": 0}).sort("order", 1).to_list(100)
+        self.version = await self._current_version()
+        self.levels = levels
+        self._checked_at = time.monotonic()
+        self.reloads += 1
+    
+    async def get(self) -> List[Dict]:
+        if self.levels is None or time.monotonic() - self._checked_at >= self.poll:
+            async with self._lock:
+                if self.levels is None:
+                    await self.load()
+                elif time.monotonic() - self._checked_at >= self.poll:
+                    if await self._current_version() != self.version:
+                        await self.load()
+                    else:
+                        self._checked_at = time.monotonic()
+        return self.levels
+    
+    async def bump(self):
+        """Publica uma nova versão após uma escrita e recarrega este worker"""
+        await db.config_versions.update_one({"_id": self.VERSION_ID}, {"$inc": {"version": 1}}, upsert=True)
+        async with self._lock:
+            await self.load()
+    
+    def stats(self) -> Dict:
+        return {
+            "version": self.version,
+            "levels": len(self.levels or []),
+            "poll_seconds": self.poll,
+            "reloads": self.reloads
+        }
+
+career_levels_cache = CareerLevelCache(CAREER_LEVELS_POLL)
+
+@api_router.get("/career-levels", dependencies=[Depends(not_modified)])
+async def get_career_levels(current_user: User = Depends(get_current_user)):
+    """Retorna configuração de níveis de carreira"""
+    return await career_levels_cache.get()
 
 @api_router.put("/career-levels/{level_id}")
 async def update_career_level(level_id: str, level_data: dict, current_user: User = Depends(require_admin)):
@@ -1117,6 +2879,7 @@ async def update_career_level(level_id: str, level_data: dict, current_user: Use
     }
     
     await db.career_levels.update_one({"id": level_id}, {"$set": update_data})
+    await career_levels_cache.bump()
     
     updated = await db.career_levels.find_one({"id": level_id}, {"_id": 0})
     return updated
@@ -1145,6 +2908,7 @@ async def create_career_level(level_data: dict, current_user: User = Depends(req
     
     await db.career_levels.insert_one(new_level)
     new_level.pop("_id", None)
+    await career_levels_cache.bump()
     
     return new_level
 
@@ -1154,18 +2918,148 @@ async def delete_career_level(level_id: str, current_user: User = Depends(requir
     result = await db.career_levels.delete_one({"id": level_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Nível não encontrado")
+    await career_levels_cache.bump()
     
     return {"message": "Nível removido com sucesso"}
 
+# ==================== PROMOÇÕES DE CARREIRA ====================
+
+PROMOTION_CHUNK_SIZE = 500
+
+async def _promotion_inputs(agents: List[Dict]) -> Dict[str, Dict]:
+    """TPV do mês mais recente e meses com resultado de cada agente, numa agregação só"""
+    # Leituras criam KPIs vazios (inclusive de meses futuros): só contam meses até o
+    # atual com algum resultado lançado
+    pipeline = [
+        {"$match": {
+            "user_id": {"$in": [a["id"] for a in agents]},
+            "month": {"$lte": datetime.now().strftime("%Y-%m")},
+            "$or": [{field: {"$gt": 0}} for field in KPI_RESULT_FIELDS],
+        }},
+        {"$sort": {"user_id": 1, "month": -1}},
+        {"$group": {
+            "_id": "$user_id",
+            "tpv": {"$first": "$tpv_m1_realizado"},
+            "months": {"$sum": 1},
+        }},
+    ]
+    return {doc["_id"]: doc async for doc in db.kpis.aggregate(pipeline)}
+
+async def evaluate_promotions(user_ids: Optional[List[str]] = None, source: str = "batch", dry_run: bool = False) -> Dict:
+    """Promove os agentes elegíveis segundo o plano de carreira em cache (nunca rebaixa)"""
+    import uuid
+    ladder = CareerLadder(await career_levels_cache.get(), allowed_names=[l.value for l in CareerLevel])
+    query: Dict[str, Any] = {"role": "agent", "archived": {"$ne": True}}
+    if user_ids is not None:
+        query["id"] = {"$in": list(user_ids)}
+    cursor = db.users.find(query, {"_id": 0, "id": 1, "career_level": 1, "time_in_company": 1})
+    
+    now = datetime.now(timezone.utc).isoformat()
+    promotions: List[Dict] = []
+    evaluated = 0
+    
+    async def evaluate(chunk: List[Dict]):
+        inputs = await _promotion_inputs(chunk)
+        for agent in chunk:
+            stats = inputs.get(agent["id"], {})
+            tpv = stats.get("tpv") or 0
+            # Tempo de casa informado ou, se maior, meses com KPI registrado
+            months = max(agent.get("time_in_company") or 0, stats.get("months", 0))
+            current = agent.get("career_level", CareerLevel.RECRUTA.value)
+            target = ladder.promotion(current, tpv, months)
+            if target:
+                promotions.append({
+                    "id": str(uuid.uuid4()),
+                    "user_id": agent["id"],
+                    "from_level": current,
+                    "to_level": target,
+                    "tpv": tpv,
+                    "months": months,
+                    "source": source,
+                    "promoted_at": now,
+                })
+    
+    chunk: List[Dict] = []
+    async for agent in cursor:
+        chunk.append(agent)
+        evaluated += 1
+        if len(chunk) == PROMOTION_CHUNK_SIZE:
+            await evaluate(chunk)
+            chunk = []
+    if chunk:
+        await evaluate(chunk)
+    
+    result = {"evaluated": evaluated, "promoted": 0, "dry_run": dry_run, "promotions": promotions}
+    if dry_run or not promotions:
+        return result
+    
+    # O filtro pelo nível de origem evita sobrescrever uma alteração manual concorrente
+    write = await db.users.bulk_write([
+        UpdateOne(
+            {"id": p["user_id"], "career_level": p["from_level"]},
+            {"$set": {"career_level": p["to_level"], "updated_at": now}}
+        )
+        for p in promotions
+    ], ordered=False)
+    result["promoted"] = write.modified_count
+    
+    applied = promotions
+    if write.modified_count != len(promotions):
+        current = await db.users.find(
+            {"id": {"$in": [p["user_id"] for p in promotions]}}, {"_id": 0, "id": 1, "career_level": 1}
+        ).to_list(None)
+        levels = {u["id"]: u.get("career_level") for u in current}
+        applied = [p for p in promotions if levels.get(p["user_id"]) == p["to_level"]]
+    result["promotions"] = applied
+    if not applied:
+        return result
+    
+    await db.career_promotions.insert_many([dict(p) for p in applied])
+    await db.leaderboard.bulk_write([
+        UpdateMany({"user_id": p["user_id"]}, {"$set": {"career_level": p["to_level"]}}) for p in applied
+    ], ordered=False)
+    for p in applied:
+        user_cache.invalidate(p["user_id"])
+        await enqueue_user_rollups(p["user_id"], [p["from_level"], p["to_level"]])
+        logger.info(f"Promoção: {p['user_id']} {p['from_level']} → {p['to_level']} ({source})")
+    return result
+
+async def _promote_after_kpi_write(keys: List[tuple]):
+    await evaluate_promotions([user_id for (user_id,) in keys], source="kpi")
+
+promotion_queue = DebouncedQueue(BONUS_RECOMPUTE_DEBOUNCE, _promote_after_kpi_write, "avaliação de promoções")
+
+@api_router.post("/admin/promotions/evaluate")
+async def run_promotions(dry_run: bool = False, current_user: User = Depends(require_admin)):
+    """Avalia a equipe inteira contra o plano de carreira; dry_run apenas lista as promoções"""
+    return await evaluate_promotions(source="batch", dry_run=dry_run)
+
+@api_router.get("/admin/promotions")
+async def get_promotions(user_id: Optional[str] = None, limit: int = 100, current_user: User = Depends(require_admin)):
+    """Trilha de auditoria das promoções, mais recentes primeiro"""
+    query = {"user_id": user_id} if user_id else {}
+    limit = max(1, min(limit, 1000))
+    return await db.career_promotions.find(query, {"_id": 0}).sort("promoted_at", -1).limit(limit).to_list(limit)
+
 app.include_router(api_router)
 
+@app.exception_handler(WaitQueueTimeoutError)
+async def pool_exhausted_handler(request: Request, exc: WaitQueueTimeoutError):
+    """Pool de conexões esgotado além de MONGO_WAIT_QUEUE_TIMEOUT_MS: falha rápida em vez de acumular espera"""
+    logger.warning(f"Pool do MongoDB esgotado em {request.url.path}: {exc}")
+    return JSONResponse(status_code=503, content={"detail": "Banco de dados sobrecarregado, tente novamente"}, headers={"Retry-After": "1"})
+
+app.add_middleware(ETagMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "Server-Timing", "ETag"],
 )
+# Mais externo: mede também o ETag, o CORS e as respostas 304
+app.add_middleware(MetricsMiddleware)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -1173,6 +3067,194 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+# ==================== ÍNDICES ====================
+
+POR_USUARIO_MES = [("user_id", 1), ("month", 1)]
+# Exportação por intervalo de meses, ordenada por (month, user_id)
+POR_MES_USUARIO = [("month", 1), ("user_id", 1)]
+
+MONGO_INDEXES = {
+    "users": [
+        ([("id", 1)], {"unique": True}),
+        ([("email", 1)], {"unique": True}),
+        ([("email", 1)], {"collation": EMAIL_COLLATION, "name": "email_ci"}),
+        ([("role", 1), ("archived", 1)], {}),
+        # Paginação por cursor (created_at, id) com e sem filtro de arquivados
+        ([("archived", 1), ("created_at", 1), ("id", 1)], {}),
+        ([("created_at", 1), ("id", 1)], {}),
+        ([("career_level", 1), ("archived", 1)], {}),
+        ([("name_lower", 1)], {}),
+        ([("email_lower", 1)], {}),
+    ],
+    "kpis": [
+        (POR_USUARIO_MES, {"unique": True}),
+        ([("id", 1)], {"unique": True}),
+        (POR_MES_USUARIO, {}),
+    ],
+    "bonus": [
+        (POR_USUARIO_MES, {"unique": True}),
+        ([("id", 1)], {"unique": True}),
+        (POR_MES_USUARIO, {}),
+    ],
+    "forecast": [
+        (POR_USUARIO_MES, {"unique": True}),
+        ([("id", 1)], {"unique": True}),
+        (POR_MES_USUARIO, {}),
+    ],
+    "extrato": [
+        (POR_USUARIO_MES, {"unique": True}),
+        ([("id", 1)], {"unique": True}),
+    ],
+    "dre": [
+        # Vários DREs podem existir para o mesmo mês
+        (POR_USUARIO_MES, {}),
+        ([("id", 1)], {"unique": True}),
+        (POR_MES_USUARIO, {}),
+    ],
+    "competencias": [
+        ([("user_id", 1)], {"unique": True}),
+        ([("id", 1)], {"unique": True}),
+    ],
+    "gamification": [
+        # Documentos criados pelo upsert de award_badge não têm "id"
+        ([("user_id", 1)], {"unique": True}),
+    ],
+    "career_levels": [
+        ([("id", 1)], {"unique": True}),
+        ([("order", 1)], {}),
+    ],
+    "outbox": [
+        ([("id", 1)], {"unique": True}),
+        ([("status", 1), ("next_attempt_at", 1)], {}),
+        ([("status", 1), ("locked_until", 1)], {}),
+        # Remove enviados e descartados após OUTBOX_RETENTION
+        ([("expire_at", 1)], {"expireAfterSeconds": 0}),
+    ],
+    "rollups": [
+        ([("month", 1), ("career_level", 1)], {"unique": True}),
+    ],
+    "career_promotions": [
+        ([("id", 1)], {"unique": True}),
+        ([("user_id", 1), ("promoted_at", -1)], {}),
+        ([("promoted_at", -1)], {}),
+    ],
+    "leaderboard": [
+        # Índice único exigido pelo $merge e índice de leitura ordenada por posição
+        ([("period", 1), ("period_key", 1), ("user_id", 1)], {"unique": True}),
+        ([("period", 1), ("period_key", 1), ("position", 1)], {}),
+        ([("user_id", 1)], {}),
+    ],
+}
+
+# Formatos de consulta usados em server.py: (coleção, filtro, ordenação)
+QUERY_SHAPES = [
+    ("users", {"id": "x"}, None),
+    ("users", {"email": "x"}, None),
+    ("users", {"email": "x", "id": {"$ne": "y"}}, None),
+    ("users", {"role": "agent", "archived": {"$ne": True}}, None),
+    ("users", {"archived": {"$ne": True}}, None),
+    ("users", {"archived": True}, None),
+    ("users", {"archived": {"$ne": True}}, [("created_at", 1), ("id", 1)]),
+    ("users", {}, [("created_at", 1), ("id", 1)]),
+    ("users", {"career_level": "Recruta", "archived": {"$ne": True}}, None),
+    ("users", {"$or": [{"name_lower": {"$regex": "^jo"}}, {"email_lower": {"$regex": "^jo"}}]}, None),
+    ("kpis", {"user_id": "x", "month": "2025-01"}, None),
+    ("kpis", {"user_id": "x"}, None),
+    ("kpis", {"user_id": "x", "month": {"$gte": "2025-01", "$lte": "2025-06"}}, [("month", 1)]),
+    ("bonus", {"user_id": "x", "month": {"$gte": "2025-01", "$lte": "2025-06"}}, None),
+    ("bonus", {"user_id": "x", "month": "2025-01"}, None),
+    ("forecast", {"user_id": "x", "month": "2025-01"}, None),
+    ("extrato", {"user_id": "x", "month": "2025-01"}, None),
+    ("dre", {"user_id": "x"}, None),
+    ("dre", {"id": "x"}, None),
+    ("kpis", {"month": {"$gte": "2025-01", "$lte": "2025-12"}}, [("month", 1), ("user_id", 1)]),
+    ("bonus", {"month": {"$gte": "2025-01", "$lte": "2025-12"}}, [("month", 1), ("user_id", 1)]),
+    ("dre", {"month": {"$gte": "2025-01", "$lte": "2025-12"}}, [("month", 1), ("user_id", 1)]),
+    ("forecast", {"month": {"$gte": "2025-01", "$lte": "2025-12"}}, [("month", 1), ("user_id", 1)]),
+    ("competencias", {"user_id": "x"}, None),
+    ("gamification", {"user_id": "x"}, None),
+    ("career_levels", {"id": "x"}, None),
+    ("career_levels", {}, [("order", 1)]),
+    ("leaderboard", {"period": "monthly", "period_key": "2025-01"}, [("position", 1)]),
+    ("leaderboard", {"user_id": "x"}, None),
+    ("rollups", {"month": "2025-01"}, None),
+    ("outbox", {"status": "pending", "next_attempt_at": {"$lte": "2025-01-01"}}, [("next_attempt_at", 1)]),
+    ("career_promotions", {"user_id": "x"}, [("promoted_at", -1)]),
+    ("career_promotions", {}, [("promoted_at", -1)]),
+    ("users", {"role": "agent", "archived": {"$ne": True}, "career_level": "Recruta"}, None),
+]
+
+async def ensure_indexes():
+    """Cria (idempotentemente) os índices de todas as coleções e reporta o tempo de build"""
+    inicio_total = time.perf_counter()
+    for collection, indexes in MONGO_INDEXES.items():
+        inicio = time.perf_counter()
+        for keys, options in indexes:
+            try:
+                await db[collection].create_index(keys, **options)
+            except OperationFailure as e:
+                # Ex.: duplicatas pré-existentes impedem um índice único
+                logger.error(f"Falha ao criar índice {keys} em {collection}: {e}")
+        logger.info(f"Índices de {collection} prontos em {(time.perf_counter() - inicio) * 1000:.1f} ms")
+    logger.info(f"Build de índices concluído em {(time.perf_counter() - inicio_total) * 1000:.1f} ms")
+
+async def backfill_user_search_keys():
+    """Preenche name_lower/email_lower dos usuários gravados antes da busca por prefixo"""
+    cursor = db.users.find({"name_lower": {"$exists": False}}, {"_id": 0, "id": 1, "name": 1, "email": 1})
+    updates = [
+        UpdateOne({"id": u["id"]}, {"$set": user_search_keys(u.get("name", ""), u.get("email", ""))})
+        async for u in cursor
+    ]
+    if updates:
+        await db.users.bulk_write(updates, ordered=False)
+        logger.info(f"Campos de busca preenchidos para {len(updates)} usuários")
+
+def _stages(plan: Dict) -> List[str]:
+    stages = [plan.get("stage")]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages += _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += _stages(child)
+    return stages
+
+async def check_indexes():
+    """Falha se algum formato de consulta de server.py executar sem índice (COLLSCAN)"""
+    sem_indice = []
+    for collection, query, sort in QUERY_SHAPES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = (await cursor.explain())["queryPlanner"]["winningPlan"]
+        if "COLLSCAN" in _stages(plan):
+            sem_indice.append(f"{collection} {query} sort={sort}")
+    
+    if sem_indice:
+        raise RuntimeError("Consultas sem índice: " + "; ".join(sem_indice))
+    logger.info(f"{len(QUERY_SHAPES)} formatos de consulta verificados: todos indexados")
+
+async def startup():
+    await ensure_indexes()
+    await backfill_user_search_keys()
+    if os.environ.get("MONGO_INDEX_CHECK", "").lower() in ("1", "true", "strict"):
+        await check_indexes()
+    await career_levels_cache.load()
+
+    bonus_queue.start()
+    rollup_queue.start()
+    badge_queue.start()
+    promotion_queue.start()
+    user_cleanup_queue.start()
+    orphan_sweeper.start()
+    outbox_worker.start()
+
+async def shutdown():
+    await bonus_queue.stop()
+    await rollup_queue.stop()
+    await badge_queue.stop()
+    await promotion_queue.stop()
+    await user_cleanup_queue.stop()
+    await orphan_sweeper.stop()
+    await outbox_worker.stop()
+    password_executor.shutdown(wait=False)
+    bulk_password_executor.shutdown(wait=False)
@@ -46,6 +46,7 @@ export default function AdminDashboardPage() {
   
   // States
   const [sellers, setSellers] = useState([]);
+  const [rollup, setRollup] = useState(null);
   const [loading, setLoading] = useState(true);
   const [refreshing, setRefreshing] = useState(false);
   const [searchQuery, setSearchQuery] = useState('');
@@ -70,36 +71,22 @@ export default function AdminDashboardPage() {
       setRefreshing(true);
       const currentMonth = new Date().toISOString().slice(0, 7);
       
-      // Fetch users
-      const usersResponse = await api.get('/users');
-      const users = usersResponse.data || [];
+      // Totais da equipe vêm pré-agregados do servidor
+      const rollupRequest = api.get('/analytics/rollups', { params: { month: currentMonth } });
       
-      // Fetch KPIs for each user
-      const sellersWithKPIs = await Promise.all(
-        users.map(async (u) => {
-          try {
-            const kpiResponse = await api.get(`/kpis/${u.id}/${currentMonth}`);
-            const kpis = kpiResponse.data;
-            
-            // Calculate atingimento
-            const atingimento = calculateAtingimento(kpis);
-            
-            return {
-              ...u,
-              kpis,
-              atingimento,
-            };
-          } catch {
-            return {
-              ...u,
-              kpis: null,
-              atingimento: 0,
-            };
-          }
-        })
-      );
+      // Visão geral paginada: agentes + KPIs + atingimento calculado no servidor
+      const sellersWithKPIs = [];
+      let cursor = null;
+      do {
+        const response = await api.get('/admin/overview', {
+          params: { month: currentMonth, ...(cursor && { cursor }) },
+        });
+        sellersWithKPIs.push(...(response.data.items || []));
+        cursor = response.data.next_cursor;
+      } while (cursor);
       
-      setSellers(sellersWithKPIs.filter((s) => s.role !== 'admin'));
+      setSellers(sellersWithKPIs);
+      setRollup((await rollupRequest).data.total);
     } catch (error) {
       console.error('Error fetching sellers:', error);
       toast.error('Erro ao carregar vendedores');
@@ -109,69 +96,20 @@ export default function AdminDashboardPage() {
     }
   };
 
-  const calculateAtingimento = (kpis) => {
-    if (!kpis) return 0;
-    
-    const weights = {
-      novos_ativos: 0.3,
-      churn: 0.2,
-      tpv_m1: 0.2,
-      ativos_m1: 0.15,
-      migracao_hunter: 0.15,
-    };
-    
-    let total = 0;
-    
-    // Novos Ativos
-    if (kpis.novos_ativos > 0) {
-      total += (kpis.novos_ativos_realizado / kpis.novos_ativos) * 100 * weights.novos_ativos;
-    }
-    
-    // Churn (inverse - lower is better)
-    if (kpis.churn > 0) {
-      const churnAtingimento = Math.max(0, ((kpis.churn - kpis.churn_realizado) / kpis.churn + 1)) * 100;
-      total += Math.min(churnAtingimento, 200) * weights.churn;
-    }
-    
-    // TPV M1
-    if (kpis.tpv_m1 > 0) {
-      total += (kpis.tpv_m1_realizado / kpis.tpv_m1) * 100 * weights.tpv_m1;
-    }
-    
-    // Ativos M1
-    if (kpis.ativos_m1 > 0) {
-      total += (kpis.ativos_m1_realizado / kpis.ativos_m1) * 100 * weights.ativos_m1;
-    }
-    
-    // Migração Hunter
-    if (kpis.migracao_hunter > 0) {
-      total += (kpis.migracao_hunter_realizado / kpis.migracao_hunter) * 100 * weights.migracao_hunter;
-    }
-    
-    return total;
-  };
-
   // Calculate stats
   const stats = useMemo(() => {
-    if (!sellers.length) return null;
-    
-    const activeSellers = sellers.filter((s) => !s.archived);
-    const totalTPV = sellers.reduce((acc, s) => acc + (s.kpis?.tpv_m1_realizado || 0), 0);
-    const avgAtingimento = sellers.reduce((acc, s) => acc + (s.atingimento || 0), 0) / sellers.length;
-    const avgChurn = sellers.reduce((acc, s) => acc + (s.kpis?.churn_realizado || 0), 0) / sellers.length;
-    const sellersOnTarget = sellers.filter((s) => s.atingimento >= 100).length;
-    const sellersNeedAttention = sellers.filter((s) => s.atingimento < 80).length;
+    if (!rollup) return null;
     
     return {
-      totalSellers: sellers.length,
-      activeSellers: activeSellers.length,
-      totalTPV,
-      avgAtingimento,
-      avgChurn,
-      sellersOnTarget,
-      sellersNeedAttention,
+      totalSellers: rollup.agents,
+      activeSellers: rollup.agents,
+      totalTPV: rollup.kpis.tpv_m1.sum,
+      avgAtingimento: rollup.atingimento.avg,
+      avgChurn: rollup.kpis.churn.avg,
+      sellersOnTarget: rollup.at_target,
+      sellersNeedAttention: rollup.below_80,
     };
-  }, [sellers]);
+  }, [rollup]);
 
   // Filter sellers
   const filteredSellers = useMemo(() => {
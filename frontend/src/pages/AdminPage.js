@@ -5,7 +5,7 @@ import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
 import { Label } from '@/components/ui/label';
 import { useAuth } from '@/contexts/AuthContext';
-import api from '@/utils/api';
+import api, { fetchAllPages } from '@/utils/api';
 import { toast } from 'sonner';
 import { Users, Edit2 } from 'lucide-react';
 import {
@@ -32,8 +32,7 @@ export default function AdminPage() {
 
   const fetchUsers = async () => {
     try {
-      const response = await api.get('/users');
-      setUsers(response.data);
+      setUsers(await fetchAllPages('/users'));
     } catch (error) {
       console.error('Error fetching users:', error);
     } finally {
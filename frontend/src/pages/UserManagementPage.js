@@ -50,6 +50,8 @@ export default function UserManagementPage() {
   const { user: currentUser } = useAuth();
   const [users, setUsers] = useState([]);
   const [archivedUsers, setArchivedUsers] = useState([]);
+  const [usersCursor, setUsersCursor] = useState(null);
+  const [archivedCursor, setArchivedCursor] = useState(null);
   const [loading, setLoading] = useState(true);
   const [showArchived, setShowArchived] = useState(false);
   const [searchQuery, setSearchQuery] = useState('');
@@ -75,17 +77,25 @@ export default function UserManagementPage() {
     generate_temp_password: false,
   });
 
+  // Busca no servidor (inclui usuários ainda não carregados), com debounce
   useEffect(() => {
-    if (currentUser?.role === 'admin') {
+    if (currentUser?.role !== 'admin') return undefined;
+    const timer = setTimeout(() => {
       fetchUsers();
       fetchArchivedUsers();
-    }
-  }, [currentUser]);
+    }, searchQuery ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [currentUser, searchQuery]);
+
+  const searchParams = () => (searchQuery.trim() ? { q: searchQuery.trim() } : {});
 
-  const fetchUsers = async () => {
+  const fetchUsers = async (cursor = null) => {
     try {
-      const response = await api.get('/users?include_archived=false');
-      setUsers(response.data);
+      const response = await api.get('/users', {
+        params: { include_archived: false, ...searchParams(), ...(cursor && { cursor }) },
+      });
+      setUsers((prev) => (cursor ? [...prev, ...response.data] : response.data));
+      setUsersCursor(response.headers?.['x-next-cursor'] || null);
     } catch (error) {
       console.error('Error fetching users:', error);
       toast.error('Erro ao carregar usuários');
@@ -94,10 +104,13 @@ export default function UserManagementPage() {
     }
   };
 
-  const fetchArchivedUsers = async () => {
+  const fetchArchivedUsers = async (cursor = null) => {
     try {
-      const response = await api.get('/users/archived/list');
-      setArchivedUsers(response.data);
+      const response = await api.get('/users/archived/list', {
+        params: { ...searchParams(), ...(cursor && { cursor }) },
+      });
+      setArchivedUsers((prev) => (cursor ? [...prev, ...response.data] : response.data));
+      setArchivedCursor(response.headers?.['x-next-cursor'] || null);
     } catch (error) {
       console.error('Error fetching archived users:', error);
     }
@@ -204,10 +217,8 @@ export default function UserManagementPage() {
     setSelectedUser(null);
   };
 
-  const filteredUsers = (showArchived ? archivedUsers : users)?.filter((u) =>
-    u.name?.toLowerCase().includes(searchQuery.toLowerCase()) ||
-    u.email?.toLowerCase().includes(searchQuery.toLowerCase())
-  ) || [];
+  // Já filtrado pelo servidor (parâmetro q)
+  const filteredUsers = (showArchived ? archivedUsers : users) || [];
 
   if (currentUser?.role !== 'admin') {
     return (
@@ -381,6 +392,18 @@ export default function UserManagementPage() {
           </Table>
         </TableContainer>
 
+        {(showArchived ? archivedCursor : usersCursor) && (
+          <Box display="flex" justifyContent="center" mt={2}>
+            <Button
+              variant="outlined"
+              onClick={() => (showArchived ? fetchArchivedUsers(archivedCursor) : fetchUsers(usersCursor))}
+              data-testid="load-more-users-btn"
+            >
+              Carregar mais
+            </Button>
+          </Box>
+        )}
+
         {/* Create User Modal */}
         <Dialog open={openCreateModal} onClose={() => setOpenCreateModal(false)} maxWidth="sm" fullWidth>
           <DialogTitle>Criar Novo Usuário</DialogTitle>
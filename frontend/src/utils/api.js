@@ -15,4 +15,16 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
+// Percorre todas as páginas de um endpoint paginado por cursor (header X-Next-Cursor)
+export const fetchAllPages = async (path, params = {}) => {
+  const items = [];
+  let cursor = null;
+  do {
+    const response = await api.get(path, { params: { ...params, ...(cursor && { cursor }) } });
+    items.push(...(response.data || []));
+    cursor = response.headers?.['x-next-cursor'];
+  } while (cursor);
+  return items;
+};
+
 export default api;
\ No newline at end of file
@@ -0,0 +1,570 @@
+"""
+Test suite for MOT Platform - Batch and aggregated endpoints
+Tests: /admin/overview, /kpis/bulk, /users pagination, /export, /kpis range, /analytics/rollups, ETag caching, /users/bulk, promotions
+"""
+import pytest
+import requests
+import os
+import json
+import time
+import uuid
+from datetime import datetime
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'https://goal-meta.preview.emergentagent.com').rstrip('/')
+
+
+class TestAdminOverview:
+    """Admin overview endpoint tests"""
+    
+    @pytest.fixture(scope="class")
+    def admin_token(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": "admin@mot.com",
+            "password": "admin123"
+        })
+        return response.json()["token"]
+    
+    def test_overview_returns_agents_with_kpis(self, admin_token):
+        """Test GET /admin/overview returns agents with KPIs and atingimento"""
+        current_month = datetime.now().strftime("%Y-%m")
+        response = requests.get(
+            f"{BASE_URL}/api/admin/overview",
+            params={"month": current_month},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 200
+        
+        data = response.json()
+        assert data["month"] == current_month
+        assert isinstance(data["items"], list)
+        assert "next_cursor" in data
+        
+        for item in data["items"]:
+            assert item["role"] == "agent"
+            assert "password" not in item
+            assert "kpis" in item
+            assert "bonus" in item
+            assert "forecast" in item
+            assert isinstance(item["atingimento"], (int, float))
+    
+    def test_overview_pagination(self, admin_token):
+        """Test following next_cursor never repeats an agent"""
+        seen = set()
+        cursor = None
+        while True:
+            params = {"limit": 1}
+            if cursor:
+                params["cursor"] = cursor
+            response = requests.get(
+                f"{BASE_URL}/api/admin/overview",
+                params=params,
+                headers={"Authorization": f"Bearer {admin_token}"}
+            )
+            assert response.status_code == 200
+            data = response.json()
+            assert len(data["items"]) <= 1
+            for item in data["items"]:
+                assert item["id"] not in seen
+                seen.add(item["id"])
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+    
+    def test_overview_does_not_write_placeholders(self, admin_token):
+        """Test agents without KPIs get defaults in the response only"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = requests.get(f"{BASE_URL}/api/admin/overview", params={"month": "2999-01"}, headers=headers)
+        assert response.status_code == 200
+        items = response.json()["items"]
+        if not items:
+            pytest.skip("Nenhum agente cadastrado")
+        assert items[0]["kpis"]["month"] == "2999-01"
+        stored = requests.get(
+            f"{BASE_URL}/api/kpis/{items[0]['id']}",
+            params={"from": "2999-01", "to": "2999-01"},
+            headers=headers
+        )
+        assert stored.json() == []
+    
+    def test_overview_requires_admin(self):
+        """Test overview rejects unauthenticated requests"""
+        response = requests.get(f"{BASE_URL}/api/admin/overview")
+        assert response.status_code in [401, 403]
+
+
+class TestBulkKPIImport:
+    """Bulk KPI import endpoint tests"""
+    
+    @pytest.fixture(scope="class")
+    def admin_token(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": "admin@mot.com",
+            "password": "admin123"
+        })
+        return response.json()["token"]
+    
+    @pytest.fixture(scope="class")
+    def agent_id(self, admin_token):
+        response = requests.get(
+            f"{BASE_URL}/api/users",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        agents = [u for u in response.json() if u.get("role") == "agent"]
+        if not agents:
+            pytest.skip("No agent available")
+        return agents[0]["id"]
+    
+    def test_bulk_import_ndjson(self, admin_token, agent_id):
+        """Test NDJSON import writes valid rows and reports invalid ones"""
+        current_month = datetime.now().strftime("%Y-%m")
+        body = "\n".join([
+            json.dumps({"user_id": agent_id, "month": current_month, "novos_ativos_realizado": 7}),
+            json.dumps({"user_id": agent_id, "month": "invalid", "novos_ativos_realizado": 1}),
+            json.dumps({"user_id": "no-such-user", "month": current_month, "churn_realizado": 2.5}),
+            "{not json",
+        ])
+        response = requests.post(
+            f"{BASE_URL}/api/kpis/bulk",
+            data=body.encode("utf-8"),
+            headers={
+                "Authorization": f"Bearer {admin_token}",
+                "Content-Type": "application/x-ndjson"
+            }
+        )
+        assert response.status_code == 200
+        
+        data = response.json()
+        assert data["processed"] == 4
+        assert sorted(e["row"] for e in data["errors"]) == [2, 3, 4]
+        
+        kpi = requests.get(
+            f"{BASE_URL}/api/kpis/{agent_id}/{current_month}",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ).json()
+        assert kpi["novos_ativos_realizado"] == 7
+    
+    def test_bulk_import_csv(self, admin_token, agent_id):
+        """Test CSV import with empty cells leaving fields untouched"""
+        current_month = datetime.now().strftime("%Y-%m")
+        body = (
+            "user_id,month,novos_ativos_realizado,tpv_m1_realizado\n"
+            f"{agent_id},{current_month},,55000\n"
+        )
+        response = requests.post(
+            f"{BASE_URL}/api/kpis/bulk",
+            data=body.encode("utf-8"),
+            headers={
+                "Authorization": f"Bearer {admin_token}",
+                "Content-Type": "text/csv"
+            }
+        )
+        assert response.status_code == 200
+        assert response.json()["errors"] == []
+        
+        kpi = requests.get(
+            f"{BASE_URL}/api/kpis/{agent_id}/{current_month}",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ).json()
+        assert kpi["tpv_m1_realizado"] == 55000
+
+
+class TestUsersPagination:
+    """Cursor pagination for /users"""
+
+    @pytest.fixture(scope="class")
+    def admin_token(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": "admin@mot.com",
+            "password": "admin123"
+        })
+        return response.json()["token"]
+
+    def test_users_pages_do_not_repeat(self, admin_token):
+        """Test following X-Next-Cursor never repeats a user"""
+        seen = set()
+        cursor = None
+        while True:
+            params = {"limit": 1}
+            if cursor:
+                params["cursor"] = cursor
+            response = requests.get(
+                f"{BASE_URL}/api/users",
+                params=params,
+                headers={"Authorization": f"Bearer {admin_token}"}
+            )
+            assert response.status_code == 200
+            page = response.json()
+            assert len(page) <= 1
+            for user in page:
+                assert user["id"] not in seen
+                assert "password" not in user
+                seen.add(user["id"])
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        assert len(seen) > 0
+
+    def test_users_projection(self, admin_token):
+        """Test fields= returns only the requested fields plus id"""
+        response = requests.get(
+            f"{BASE_URL}/api/users",
+            params={"fields": "name,email", "include_total": "true"},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 200
+        assert int(response.headers["X-Total-Count"]) >= len(response.json())
+        for user in response.json():
+            assert set(user) <= {"id", "created_at", "name", "email"}
+
+    def test_users_search_is_case_insensitive(self, admin_token):
+        """Test q matches the start of the name or email regardless of case"""
+        response = requests.get(
+            f"{BASE_URL}/api/users",
+            params={"q": "ADMIN@MOT"},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 200
+        assert "admin@mot.com" in [u["email"] for u in response.json()]
+
+
+class TestExport:
+    """Streaming export endpoints"""
+
+    @pytest.fixture(scope="class")
+    def admin_token(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": "admin@mot.com",
+            "password": "admin123"
+        })
+        return response.json()["token"]
+
+    def test_export_kpis_csv(self, admin_token):
+        """Test CSV export has a header and only rows inside the range"""
+        response = requests.get(
+            f"{BASE_URL}/api/export/kpis",
+            params={"from": "2000-01", "to": "2100-12"},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        lines = response.text.splitlines()
+        assert lines[0].startswith("id,user_id,month")
+
+    def test_export_bonus_ndjson_gzip(self, admin_token):
+        """Test gzip NDJSON export decompresses into JSON lines"""
+        import gzip
+        response = requests.get(
+            f"{BASE_URL}/api/export/bonus",
+            params={"format": "ndjson", "gzip": "true"},
+            headers={"Authorization": f"Bearer {admin_token}"},
+            stream=True
+        )
+        assert response.status_code == 200
+        for line in gzip.decompress(response.raw.read()).decode().splitlines():
+            assert "month" in json.loads(line)
+
+    def test_export_rejects_unknown_collection(self, admin_token):
+        response = requests.get(
+            f"{BASE_URL}/api/export/users",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 404
+
+
+class TestKPIRange:
+    """KPI time series and extrato history"""
+
+    @pytest.fixture(scope="class")
+    def admin_token(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": "admin@mot.com",
+            "password": "admin123"
+        })
+        return response.json()["token"]
+
+    @pytest.fixture(scope="class")
+    def agent_id(self, admin_token):
+        response = requests.get(
+            f"{BASE_URL}/api/users",
+            params={"role": "agent", "limit": 1},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        agents = response.json()
+        if not agents:
+            pytest.skip("Nenhum agente cadastrado")
+        return agents[0]["id"]
+
+    def test_kpi_range_is_sorted_and_bounded(self, admin_token, agent_id):
+        """Test GET /kpis/{user_id}?from=&to= returns months inside the range in order"""
+        current_month = datetime.now().strftime("%Y-%m")
+        requests.get(
+            f"{BASE_URL}/api/kpis/{agent_id}/{current_month}",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        response = requests.get(
+            f"{BASE_URL}/api/kpis/{agent_id}",
+            params={"from": "2000-01", "to": current_month},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 200
+        months = [k["month"] for k in response.json()]
+        assert months == sorted(months)
+        assert current_month in months
+        assert all("2000-01" <= m <= current_month for m in months)
+        assert all("atingimento" in k for k in response.json())
+
+    def test_kpi_range_rejects_bad_month(self, admin_token, agent_id):
+        response = requests.get(
+            f"{BASE_URL}/api/kpis/{agent_id}",
+            params={"from": "janeiro"},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 422
+
+    def test_extrato_history_is_populated(self, admin_token, agent_id):
+        """Test historico_semestral is derived from the KPI series"""
+        current_month = datetime.now().strftime("%Y-%m")
+        response = requests.get(
+            f"{BASE_URL}/api/extrato/{agent_id}/{current_month}",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 200
+        historico = response.json()["historico_semestral"]
+        assert historico[-1]["month"] == current_month
+        assert len(historico) <= 6
+        for item in historico:
+            assert set(item) == {"month", "atingimento", "bonus"}
+
+    def test_extrato_rejects_bad_month(self, admin_token, agent_id):
+        response = requests.get(
+            f"{BASE_URL}/api/extrato/{agent_id}/abc",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 400
+
+
+class TestRollups:
+    """Team rollups by career level"""
+
+    @pytest.fixture(scope="class")
+    def admin_token(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": "admin@mot.com",
+            "password": "admin123"
+        })
+        return response.json()["token"]
+
+    def test_rollups_cover_every_career_level(self, admin_token):
+        """Test one group per career level and a consistent team total"""
+        current_month = datetime.now().strftime("%Y-%m")
+        response = requests.get(
+            f"{BASE_URL}/api/analytics/rollups",
+            params={"month": current_month},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        levels = [g["career_level"] for g in data["groups"]]
+        assert levels == ["Recruta", "Aspirante", "Consultor", "Senior", "Master"]
+        assert data["total"]["agents"] == sum(g["agents"] for g in data["groups"])
+        for group in data["groups"]:
+            assert group["month"] == current_month
+            assert "p50" in group["atingimento"]
+            assert sum(group["churn_distribution"].values()) == group["with_kpis"]
+
+    def test_rollups_filter_by_level(self, admin_token):
+        response = requests.get(
+            f"{BASE_URL}/api/analytics/rollups",
+            params={"career_level": "Senior"},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 200
+        assert [g["career_level"] for g in response.json()["groups"]] == ["Senior"]
+
+
+class TestETagCaching:
+    """Conditional GET with ETag/If-None-Match"""
+
+    @pytest.fixture(scope="class")
+    def admin_token(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": "admin@mot.com",
+            "password": "admin123"
+        })
+        return response.json()["token"]
+
+    def test_badges_are_immutable(self):
+        response = requests.get(f"{BASE_URL}/api/gamification/badges")
+        assert response.status_code == 200
+        assert "immutable" in response.headers["Cache-Control"]
+        assert response.headers["ETag"]
+
+    def test_career_levels_not_modified(self, admin_token):
+        """Test If-None-Match with the current ETag returns an empty 304"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        first = requests.get(f"{BASE_URL}/api/career-levels", headers=headers)
+        etag = first.headers["ETag"]
+        second = requests.get(f"{BASE_URL}/api/career-levels", headers={**headers, "If-None-Match": etag})
+        assert second.status_code == 304
+        assert second.content == b""
+        assert second.headers["ETag"] == etag
+
+    def test_write_changes_etag(self, admin_token):
+        """Test a KPI update makes the previous ETag stale"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        agents = requests.get(f"{BASE_URL}/api/users", params={"role": "agent", "limit": 1}, headers=headers).json()
+        if not agents:
+            pytest.skip("Nenhum agente cadastrado")
+        url = f"{BASE_URL}/api/kpis/{agents[0]['id']}/{datetime.now().strftime('%Y-%m')}"
+        before = requests.get(url, headers=headers)
+        etag = before.headers["ETag"]
+        requests.put(url, json={"novos_ativos_realizado": before.json()["novos_ativos_realizado"] + 1}, headers=headers)
+        after = requests.get(url, headers={**headers, "If-None-Match": etag})
+        assert after.status_code == 200
+        assert after.headers["ETag"] != etag
+
+    def test_query_string_has_its_own_etag(self, admin_token):
+        """Test an ETag cached for one range never yields a 304 for another range"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        agents = requests.get(f"{BASE_URL}/api/users", params={"role": "agent", "limit": 1}, headers=headers).json()
+        if not agents:
+            pytest.skip("Nenhum agente cadastrado")
+        current_month = datetime.now().strftime("%Y-%m")
+        url = f"{BASE_URL}/api/kpis/{agents[0]['id']}"
+        requests.get(f"{url}/{current_month}", headers=headers)
+        wide = requests.get(url, params={"from": "2000-01", "to": current_month}, headers=headers)
+        narrow = requests.get(url, params={"from": "2000-01", "to": "2000-02"}, headers={**headers, "If-None-Match": wide.headers["ETag"]})
+        assert narrow.status_code == 200
+        assert narrow.json() == []
+        same = requests.get(url, params={"to": current_month, "from": "2000-01"}, headers={**headers, "If-None-Match": wide.headers["ETag"]})
+        assert same.status_code == 304
+
+
+class TestBulkUsers:
+    """Bulk user provisioning"""
+
+    @pytest.fixture(scope="class")
+    def admin_token(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": "admin@mot.com",
+            "password": "admin123"
+        })
+        return response.json()["token"]
+
+    def test_bulk_create_reports_each_row(self, admin_token):
+        """Test created rows, duplicate emails and invalid rows in one request"""
+        suffix = uuid.uuid4().hex[:8]
+        payload = [
+            {"name": "TEST Bulk 1", "email": f"test_bulk1_{suffix}@mot.com", "password": "senha123"},
+            {"name": "TEST Bulk 2", "email": f"test_bulk2_{suffix}@mot.com", "generate_temp_password": True},
+            {"name": "TEST Bulk 3", "email": f"test_bulk1_{suffix}@mot.com", "password": "senha123"},
+            {"name": "TEST Bulk 4", "email": "admin@mot.com", "password": "senha123"},
+            {"name": "TEST Bulk 5", "email": "invalido"},
+        ]
+        response = requests.post(
+            f"{BASE_URL}/api/users/bulk",
+            json=payload,
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["created"] == 2
+        assert data["failed"] == 3
+        statuses = [r["status"] for r in data["results"]]
+        assert statuses == ["created", "created", "error", "error", "error"]
+        assert data["results"][1]["temporary_password"] is True
+
+        for result in data["results"][:2]:
+            requests.delete(
+                f"{BASE_URL}/api/users/{result['user_id']}",
+                headers={"Authorization": f"Bearer {admin_token}"}
+            )
+
+    def test_bulk_existing_email_ignores_case(self, admin_token):
+        """Test a mixed-case email that already exists is reported as already registered"""
+        response = requests.post(
+            f"{BASE_URL}/api/users/bulk",
+            json=[{"name": "TEST Case", "email": "Admin@MOT.com", "password": "senha123"}],
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 200
+        assert response.json()["results"][0]["error"] == "Email já cadastrado"
+
+    def test_bulk_create_csv(self, admin_token):
+        suffix = uuid.uuid4().hex[:8]
+        body = f"name,email,password,career_level\nTEST Csv,test_csv_{suffix}@mot.com,senha123,Aspirante\n"
+        response = requests.post(
+            f"{BASE_URL}/api/users/bulk",
+            data=body,
+            headers={"Authorization": f"Bearer {admin_token}", "Content-Type": "text/csv"}
+        )
+        assert response.status_code == 200
+        result = response.json()["results"][0]
+        assert result["status"] == "created"
+        requests.delete(
+            f"{BASE_URL}/api/users/{result['user_id']}",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+
+
+def shift(month, delta):
+    year, mon = map(int, month.split("-"))
+    total = year * 12 + mon - 1 + delta
+    return f"{total // 12:04d}-{total % 12 + 1:02d}"
+
+
+class TestPromotions:
+    """Automatic promotions ignore empty placeholder KPIs"""
+
+    @pytest.fixture(scope="class")
+    def admin_token(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": "admin@mot.com",
+            "password": "admin123"
+        })
+        return response.json()["token"]
+
+    def create_agent(self, headers, placeholders, results):
+        response = requests.post(f"{BASE_URL}/api/users", json={
+            "name": "TEST Promo",
+            "email": f"test_promo_{uuid.uuid4().hex[:8]}@mot.com",
+            "password": "senha123",
+        }, headers=headers)
+        user_id = response.json()["user"]["id"]
+        for month in placeholders:
+            requests.get(f"{BASE_URL}/api/kpis/{user_id}/{month}", headers=headers)
+        for month in results:
+            requests.put(f"{BASE_URL}/api/kpis/{user_id}/{month}", json={"tpv_m1_realizado": 60000}, headers=headers)
+        return user_id
+
+    def promotions(self, headers, user_id, wait=10):
+        deadline = time.time() + wait
+        while True:
+            found = requests.get(f"{BASE_URL}/api/admin/promotions", params={"user_id": user_id}, headers=headers).json()
+            if found or time.time() > deadline:
+                return found
+            time.sleep(1)
+
+    def test_placeholders_do_not_count(self, admin_token):
+        """Test browsed months add no tenure and future placeholders do not reset TPV"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        current = datetime.now().strftime("%Y-%m")
+        # 3 meses com resultado + KPIs vazios até 3 meses no futuro
+        promoted = self.create_agent(
+            headers,
+            [shift(current, d) for d in range(-6, 4)],
+            [shift(current, d) for d in (-2, -1, 0)],
+        )
+        # Só 2 meses com resultado, apesar de 7 KPIs vazios
+        short = self.create_agent(
+            headers,
+            [shift(current, d) for d in range(-6, 1)],
+            [shift(current, d) for d in (-1, 0)],
+        )
+        try:
+            found = self.promotions(headers, promoted)
+            assert [(p["to_level"], p["months"], p["tpv"]) for p in found] == [("Aspirante", 3, 60000)]
+            assert self.promotions(headers, short, wait=0) == []
+        finally:
+            for user_id in (promoted, short):
+                requests.delete(f"{BASE_URL}/api/users/{user_id}", headers=headers)
@@ -0,0 +1,50 @@
+"""
+Unit tests for MOT Platform - Career promotion ladder (backend/career.py)
+Tests: eligibility bisect, cumulative thresholds, promote-only
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from career import CareerLadder  # noqa: E402
+
+LEVELS = [
+    {"level": "Aspirante", "order": 2, "tpv_min": 50000, "time_min": 3},
+    {"level": "Recruta", "order": 1, "tpv_min": 0, "time_min": 0},
+    {"level": "Consultor", "order": 3, "tpv_min": 150000, "time_min": 6},
+    {"level": "Senior", "order": 4, "tpv_min": 300000, "time_min": 12},
+    {"level": "Master", "order": 5, "tpv_min": 500000, "time_min": 18},
+]
+
+
+class TestCareerLadder:
+    """Eligibility tests"""
+
+    def test_eligible_uses_both_requirements(self):
+        """Test the level is limited by the weaker of TPV and time"""
+        ladder = CareerLadder(LEVELS)
+        assert ladder.eligible(0, 0) == "Recruta"
+        assert ladder.eligible(200000, 4) == "Aspirante"
+        assert ladder.eligible(200000, 24) == "Consultor"
+        assert ladder.eligible(600000, 18) == "Master"
+
+    def test_thresholds_are_cumulative(self):
+        """Test a level with a lower requirement than the one below it is not a shortcut"""
+        levels = LEVELS + [{"level": "Especial", "order": 6, "tpv_min": 0, "time_min": 0}]
+        ladder = CareerLadder(levels)
+        assert ladder.eligible(100, 100) == "Recruta"
+
+    def test_only_promotes(self):
+        """Test agents are never demoted and unchanged levels return None"""
+        ladder = CareerLadder(LEVELS)
+        assert ladder.promotion("Recruta", 160000, 7) == "Consultor"
+        assert ladder.promotion("Senior", 0, 0) is None
+        assert ladder.promotion("Consultor", 160000, 7) is None
+
+    def test_allowed_names_filter_custom_levels(self):
+        """Test levels outside the allowed set are ignored"""
+        levels = LEVELS + [{"level": "Diretor", "order": 6, "tpv_min": 0, "time_min": 0}]
+        ladder = CareerLadder(levels, allowed_names=[lvl["level"] for lvl in LEVELS])
+        assert "Diretor" not in ladder.names
+        assert ladder.promotion("Diretor", 10 ** 9, 100) is None
@@ -0,0 +1,63 @@
+"""
+Integration tests for MOT Platform - Materialized leaderboard (backend/server.py)
+Tests: period rollover materializes the whole team
+Requires a MongoDB at MONGO_URL (default mongodb://localhost:27017); uses a throwaway database
+"""
+import asyncio
+import os
+import sys
+import uuid
+from datetime import datetime
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGO_URL", MONGO_URL)
+os.environ.setdefault("DB_NAME", "mot_test")
+
+try:
+    MongoClient(MONGO_URL, serverSelectionTimeoutMS=1000).admin.command("ping")
+except PyMongoError:
+    pytest.skip("MongoDB indisponível", allow_module_level=True)
+
+import server  # noqa: E402
+
+
+def agent(name):
+    return {"id": str(uuid.uuid4()), "name": name, "email": f"{name}@mot.com", "role": "agent", "archived": False}
+
+
+class TestLeaderboardRollover:
+    """Leaderboard period rollover tests"""
+
+    def test_first_write_of_new_month_lists_every_agent(self):
+        """Test the first incremental update in a fresh period materializes the whole team"""
+        async def scenario():
+            server.connect_mongo()
+            # Banco descartável: nunca o DB_NAME configurado
+            server.db = server.client[f"mot_test_{uuid.uuid4().hex[:8]}"]
+            try:
+                await server.ensure_indexes()
+                agents = [agent("ana"), agent("bia"), agent("caio")]
+                await server.db.users.insert_many([dict(a) for a in agents])
+
+                january, february = datetime(2031, 1, 20), datetime(2031, 2, 3)
+                await server.reconstruir_leaderboard("monthly", january)
+                # Primeira escrita de fevereiro: só um agente mudou
+                await server.atualizar_leaderboard_usuario(agents[0]["id"], february)
+
+                rows = await server.db.leaderboard.find(
+                    {"period": "monthly", "period_key": "2031-02"}, {"_id": 0}
+                ).sort("position", 1).to_list(None)
+                return agents, rows
+            finally:
+                await server.client.drop_database(server.db.name)
+                server.close_mongo()
+
+        agents, rows = asyncio.run(scenario())
+        assert sorted(r["user_id"] for r in rows) == sorted(a["id"] for a in agents)
+        assert [r["position"] for r in rows] == [1, 2, 3]
@@ -0,0 +1,127 @@
+"""
+Unit tests for MOT Platform - Outbox SMTP transport (backend/mailer.py)
+Tests: batch delivery over one connection, connection failures, log fallback,
+body encryption, outbox state after each attempt
+"""
+import os
+import socket
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import mailer  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def settings(port):
+    return {
+        "host": "127.0.0.1",
+        "port": port,
+        "user": None,
+        "password": None,
+        "sender": "MOT <no-reply@mot.com>",
+        "starttls": False,
+        "timeout": 5,
+    }
+
+
+EMAILS = [
+    {"to": "agente1@mot.com", "subject": "Bem-vindo", "body": "Olá 1"},
+    {"to": "agente2@mot.com", "subject": "Bem-vindo", "body": "Olá 2"},
+]
+
+
+class TestSendBatch:
+    """SMTP batch tests"""
+
+    def test_batch_delivered_to_local_smtp(self):
+        """Test every email of a batch reaches a local SMTP server"""
+        aiosmtpd = pytest.importorskip("aiosmtpd.controller")
+        from aiosmtpd.handlers import Sink
+
+        class Recorder(Sink):
+            def __init__(self):
+                self.envelopes = []
+
+            async def handle_DATA(self, server, session, envelope):
+                self.envelopes.append(envelope)
+                return "250 OK"
+
+        handler = Recorder()
+        port = free_port()
+        controller = aiosmtpd.Controller(handler, hostname="127.0.0.1", port=port)
+        controller.start()
+        try:
+            errors = mailer.send_batch(settings(port), EMAILS)
+        finally:
+            controller.stop()
+
+        assert errors == [None, None]
+        assert [e.rcpt_tos for e in handler.envelopes] == [["agente1@mot.com"], ["agente2@mot.com"]]
+
+    def test_connection_failure_marks_whole_batch(self):
+        """Test an unreachable server returns an error for every email"""
+        errors = mailer.send_batch(settings(free_port()), EMAILS)
+        assert len(errors) == 2
+        assert all(e and "SMTP" in e for e in errors)
+
+    def test_without_smtp_logs_and_succeeds(self):
+        """Test the log transport used when SMTP_HOST is not set"""
+        assert mailer.send_batch(None, EMAILS) == [None, None]
+
+
+class TestOutboxBody:
+    """Stored body encryption tests"""
+
+    def test_body_is_not_stored_in_clear(self):
+        """Test the sealed body hides the password and opens only with the same secret"""
+        cipher = mailer.body_cipher("segredo")
+        sealed = mailer.seal_body(cipher, "Senha temporária: Xy7!abc")
+        assert "Xy7!abc" not in sealed
+        assert mailer.open_body(cipher, sealed) == "Senha temporária: Xy7!abc"
+        assert mailer.open_body(mailer.body_cipher("outro"), sealed) is None
+
+
+class TestDeliveryUpdate:
+    """Outbox state transition tests"""
+
+    NOW = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    RETENTION = timedelta(days=7)
+
+    def update(self, attempts, error, final=False):
+        email = {"id": "e1", "attempts": attempts}
+        return mailer.delivery_update(email, error, self.NOW, 3, 30, self.RETENTION, final=final)
+
+    def test_failed_email_loses_body_and_expires(self):
+        """Test an email out of retries drops its body and gets the retention TTL"""
+        status, update = self.update(2, "550 mailbox unavailable")
+        assert status == "failed"
+        assert "body" in update["$unset"]
+        assert update["$set"]["expire_at"] == self.NOW + self.RETENTION
+
+    def test_unreadable_body_fails_immediately(self):
+        """Test final=True discards the email on the first attempt"""
+        status, update = self.update(0, "ilegível", final=True)
+        assert status == "failed"
+        assert "body" in update["$unset"]
+
+    def test_retry_keeps_body_with_exponential_backoff(self):
+        """Test a retried email keeps its (sealed) body and doubles the wait"""
+        status, update = self.update(1, "timeout")
+        assert status == "pending"
+        assert "body" not in update["$unset"]
+        assert update["$set"]["next_attempt_at"] == self.NOW + timedelta(seconds=60)
+
+    def test_sent_email_loses_body(self):
+        """Test a delivered email drops its body"""
+        status, update = self.update(0, None)
+        assert status == "sent"
+        assert "body" in update["$unset"]
@@ -0,0 +1,124 @@
+"""
+Unit tests for MOT Platform - MongoDB instrumentation (backend/metrics.py)
+Tests: latency histogram buckets, pool checkout accounting, per-command latency,
+per-request command counting, Prometheus rendering
+"""
+import contextvars
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from pymongo import monitoring
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import metrics  # noqa: E402
+
+ADDRESS = ("localhost", 27017)
+
+
+class TestHistogram:
+    """Histogram tests"""
+
+    def test_cumulative_buckets(self):
+        """Test observations land in the first bucket whose bound is >= value"""
+        hist = metrics.Histogram((1, 10))
+        for value in (0.5, 1, 3, 50):
+            hist.observe(value)
+        assert hist.cumulative() == [(1, 2), (10, 3), (float("inf"), 4)]
+        snap = hist.snapshot()
+        assert snap["count"] == 4
+        assert snap["buckets"] == {"1": 2, "10": 3, "+Inf": 4}
+
+
+class TestPoolStats:
+    """Connection pool listener tests"""
+
+    def test_checkout_and_wait_queue(self):
+        """Test waiting, checked-out and failed checkouts are tracked per server"""
+        stats = metrics.PoolStats()
+        stats.connection_created(monitoring.ConnectionCreatedEvent(ADDRESS, 1))
+        stats.connection_check_out_started(monitoring.ConnectionCheckOutStartedEvent(ADDRESS))
+        stats.connection_check_out_started(monitoring.ConnectionCheckOutStartedEvent(ADDRESS))
+        stats.connection_checked_out(monitoring.ConnectionCheckedOutEvent(ADDRESS, 1))
+
+        pool = stats.snapshot()["localhost:27017"]
+        assert (pool["open"], pool["checked_out"], pool["wait_queue"]) == (1, 1, 1)
+
+        stats.connection_check_out_failed(monitoring.ConnectionCheckOutFailedEvent(ADDRESS, "timeout"))
+        stats.connection_checked_in(monitoring.ConnectionCheckedInEvent(ADDRESS, 1))
+
+        pool = stats.snapshot()["localhost:27017"]
+        assert (pool["checked_out"], pool["wait_queue"]) == (0, 0)
+        assert pool["max_wait_queue"] == 2
+        assert pool["checkout_failures"] == {"timeout": 1}
+
+
+class TestCommandStats:
+    """Command listener tests"""
+
+    def test_latency_per_command(self):
+        """Test durations are recorded in milliseconds per command and failures counted"""
+        stats = metrics.CommandStats()
+        stats.succeeded(monitoring.CommandSucceededEvent(timedelta(milliseconds=3), {"ok": 1}, "find", 1, ADDRESS, 1))
+        stats.failed(monitoring.CommandFailedEvent(timedelta(milliseconds=40), {"ok": 0}, "insert", 2, ADDRESS, 2))
+
+        snap = stats.snapshot()
+        assert snap["find"]["count"] == 1
+        assert snap["find"]["sum_ms"] == 3.0
+        assert snap["find"]["failures"] == 0
+        assert snap["insert"]["failures"] == 1
+        assert snap["insert"]["buckets"]["25"] == 0
+        assert snap["insert"]["buckets"]["50"] == 1
+
+
+def started(name="find"):
+    return monitoring.CommandStartedEvent({name: "kpis", "$db": "mot"}, "mot", 1, ADDRESS, 1)
+
+
+class TestRequestCommands:
+    """Per-request command counting tests"""
+
+    def test_counter_follows_copied_context_into_threads(self):
+        """Test commands started from executor threads count for the request that issued them"""
+        stats = metrics.CommandStats()
+        counter = metrics.CommandCounter()
+        token = metrics.current_request_commands.set(counter)
+        try:
+            # Mesmo mecanismo do Motor: contexto copiado para a thread do executor
+            with ThreadPoolExecutor(2) as executor:
+                for _ in range(3):
+                    executor.submit(contextvars.copy_context().run, stats.started, started()).result()
+        finally:
+            metrics.current_request_commands.reset(token)
+
+        stats.started(started())  # fora da requisição: ignorado
+        assert counter.close() == 3
+        counter.add()
+        assert counter.count == 3
+
+
+class TestPrometheus:
+    """Prometheus text format tests"""
+
+    def test_render_histograms_in_seconds(self):
+        """Test route histograms, command counts and pool gauges are exported"""
+        requests = metrics.RequestMetrics()
+        requests.observe("GET", "/api/users/{user_id}", 200, 30.0, 4, 2048)
+        commands = metrics.CommandStats()
+        commands.succeeded(monitoring.CommandSucceededEvent(timedelta(milliseconds=3), {"ok": 1}, "find", 1, ADDRESS, 1))
+        pool = metrics.PoolStats()
+        pool.connection_created(monitoring.ConnectionCreatedEvent(ADDRESS, 1))
+
+        text = metrics.render_prometheus(requests, commands, pool)
+        route = 'method="GET",route="/api/users/{user_id}"'
+        assert f'mot_http_requests_total{{{route},status="200"}} 1' in text
+        assert f'mot_http_request_duration_seconds_bucket{{{route},le="0.025"}} 0' in text
+        assert f'mot_http_request_duration_seconds_bucket{{{route},le="0.05"}} 1' in text
+        assert f'mot_http_request_duration_seconds_sum{{{route}}} 0.03' in text
+        assert f'mot_http_request_mongo_commands_bucket{{{route},le="5"}} 1' in text
+        assert f'mot_http_request_mongo_commands_bucket{{{route},le="3"}} 0' in text
+        assert 'mot_mongo_command_duration_seconds_count{command="find"} 1' in text
+        assert 'mot_mongo_pool_open{address="localhost:27017"} 1' in text
+        assert text.endswith("\n")
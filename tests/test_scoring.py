@@ -0,0 +1,99 @@
+"""
+Unit tests for MOT Platform - Scoring engine (backend/scoring.py)
+Tests: atingimento, multiplicador, bonus_final, rollup
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import scoring  # noqa: E402
+
+
+def kpi(**realizado):
+    doc = {f"{name}_meta": meta for name, meta in scoring.KPI_META_DEFAULTS.items()}
+    doc.update({f"{name}_realizado": value for name, value in realizado.items()})
+    return doc
+
+
+class TestAtingimento:
+    """Weighted attainment tests"""
+    
+    def test_all_targets_hit(self):
+        """Test hitting every target with churn at target gives 100%"""
+        ating, mult = scoring.score_kpi(kpi(
+            novos_ativos=12, churn=5.0, tpv_m1=100000.0, ativos_m1=10, migracao_hunter=70.0
+        ))
+        assert ating == pytest.approx(100.0)
+        assert mult == 1.0
+    
+    def test_churn_is_inverse_and_capped(self):
+        """Test zero churn counts as 200% of the churn weight"""
+        ating, _ = scoring.score_kpi(kpi(churn=0.0))
+        assert ating == pytest.approx(200 * scoring.KPI_WEIGHTS["churn"])
+        
+        ating, _ = scoring.score_kpi(kpi(churn=50.0))
+        assert ating == pytest.approx(0.0)
+    
+    def test_missing_kpi_scores_zero(self):
+        """Test agents without a KPI document score 0"""
+        result = scoring.score_team([None, kpi(novos_ativos=12, churn=5.0)])
+        assert result["atingimento"][0] == 0.0
+        assert result["atingimento"][1] == pytest.approx(50.0)
+    
+    def test_zero_meta_is_ignored(self):
+        """Test a zero target contributes nothing instead of dividing by zero"""
+        doc = kpi(tpv_m1=50000.0)
+        doc["tpv_m1_meta"] = 0
+        ating, _ = scoring.score_kpi(doc)
+        assert np.isfinite(ating)
+    
+    def test_kpi_matrix_defaults(self):
+        """Test missing documents and fields fall back to default targets and zero results"""
+        meta, realizado, present = scoring.kpi_matrix([None, {"tpv_m1_realizado": 5.0}])
+        assert present.tolist() == [False, True]
+        assert meta[0].tolist() == [scoring.KPI_META_DEFAULTS[k] for k in scoring.KPI_NAMES]
+        assert realizado[1].tolist() == [0.0, 0.0, 5.0, 0.0, 0.0]
+        assert scoring.kpi_matrix([])[0].shape == (0, len(scoring.KPI_NAMES))
+
+
+class TestBonus:
+    """Multiplier and bonus cap tests"""
+    
+    def test_multiplier_bands(self):
+        """Test 100%/80% bands"""
+        mult = scoring.multiplicador(np.array([120.0, 100.0, 99.9, 80.0, 79.9]))
+        assert mult.tolist() == [1.0, 1.0, 0.8, 0.8, 0.0]
+    
+    def test_bonus_final_capped_at_two_salaries(self):
+        """Test bonus_final never exceeds two base salaries"""
+        full = kpi(novos_ativos=12, churn=5.0, tpv_m1=100000.0, ativos_m1=10, migracao_hunter=70.0)
+        result = scoring.score_team([full, full], [10000.0, 1000.0], [1570.0, 1570.0])
+        assert result["bonus_final"].tolist() == [3140.0, 1000.0]
+
+
+class TestRollup:
+    """Team aggregate tests"""
+    
+    def test_rollup_counts_and_sums(self):
+        """Test sums, target counts and churn buckets of a small team"""
+        full = kpi(novos_ativos=12, churn=1.0, tpv_m1=100000.0, ativos_m1=10, migracao_hunter=70.0)
+        half = kpi(novos_ativos=6, churn=7.0, tpv_m1=50000.0)
+        result = scoring.rollup([full, half, None])
+        assert result["agents"] == 3
+        assert result["with_kpis"] == 2
+        assert result["at_target"] == 1
+        assert result["below_80"] == 2
+        assert result["kpis"]["tpv_m1"]["sum"] == 150000.0
+        assert result["kpis"]["novos_ativos"]["at_target"] == 1
+        assert result["kpis"]["churn"]["at_target"] == 1
+        assert result["churn_distribution"] == {"0-2": 1, "2-5": 0, "5-10": 1, ">=10": 0}
+    
+    def test_rollup_empty_group(self):
+        """Test an empty group yields zeros instead of NaN"""
+        result = scoring.rollup([])
+        assert result["agents"] == 0
+        assert result["atingimento"]["p50"] == 0.0